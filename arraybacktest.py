@@ -0,0 +1,220 @@
+"""
+Быстрый событийный бэк-тест на массивах numpy с семантикой ордеров Catalyst.
+
+Повторяет логику catalyst_ma_crossover.py без самого Catalyst:
+    - ордер, выставленный на баре, исполняется на следующем баре;
+    - пока есть открытый ордер, новые решения не принимаются;
+    - размер позиции задаётся как в order_target_percent (доля от стоимости портфеля);
+    - рыночные ордера платят комиссию taker и проскальзывание spread/2,
+      лимитные - комиссию maker и исполняются по лимитной цене;
+    - первые long_window - 1 баров пропускаются (context.i < long_window).
+
+Скользящие средние Catalyst считаются по data.history(frequency='5T'): по
+закрытиям завершённых 5-минутных баров и цене текущей минуты. Их даёт
+стратегия HistoryMovingAverageCrossStrategy.
+"""
+import numpy as np
+import pandas as pd
+
+from metabacktest import Strategy, Portfolio
+
+ORDER_TYPES = ('market', 'limit')
+
+
+def history_mean(bars: pd.DataFrame, window: int, minutes: int = 5):
+    """
+    Метод векторного расчёта data.history(asset, 'close', window, '<minutes>T').mean()
+    Catalyst на каждой минуте: среднее по закрытиям window последних баров
+    по minutes минут, последний из которых - текущий незавершённый бар.
+    bars    - Минутные бары с индексом по времени (тип: pd.DataFrame())
+    window  - Число баров истории
+    minutes - Длина бара истории в минутах
+    """
+    close = bars['close'].to_numpy(dtype='float64')
+    step = minutes * 60 * 10**9
+
+    times = pd.DatetimeIndex(bars.index).values.astype('datetime64[ns]').view('int64')
+    buckets = times // step
+    # Номер бара истории, в который попадает минута
+    k = np.cumsum(np.r_[True, buckets[1:] != buckets[:-1]]) - 1
+    # Закрытие бара истории - цена последней минуты бара
+    last = np.r_[buckets[1:] != buckets[:-1], True]
+    prefix = np.concatenate(([0.0], np.cumsum(close[last])))
+
+    # Завершённые бары k - window + 1 ... k - 1 и текущая минута
+    first = np.maximum(k - window + 1, 0)
+    return (prefix[k] - prefix[first] + close) / (k - first + 1)
+
+
+class HistoryMovingAverageCrossStrategy(Strategy):
+    """
+    Стратегия Moving Average Crossover на минутных барах со скользящими
+    средними, как в catalyst_ma_crossover.handle_data().
+
+    Требования:
+        symbol - Симбол валютной пары
+        bars  - Минутные данные курса акцива
+        short_window - Окно короткой средней скользящей (в барах истории)
+        long_window -  Окно длинной средней скоьзящей (в барах истории)
+        minutes - Длина бара истории в минутах (frequency='5T' в Catalyst)
+    """
+
+    def __init__(self, symbol: str, bars: pd.DataFrame, short_window: int = 40,
+                 long_window: int = 100, minutes: int = 5):
+        self.symbol = symbol
+        self.bars = bars
+
+        self.short_window = short_window
+        self.long_window = long_window
+
+        self.signals = pd.DataFrame(index=self.bars.index)
+        self.signals['short_mavg'] = history_mean(bars, short_window, minutes)
+        self.signals['long_mavg'] = history_mean(bars, long_window, minutes)
+        self.signals['signal'] = np.where(
+            self.signals['short_mavg'] > self.signals['long_mavg'], 1.0, 0.0)
+
+    def get_signals(self):
+        return self.signals
+
+    def get_bars(self):
+        return self.bars
+
+    def get_symbol(self):
+        return self.symbol
+
+
+class ArrayPortfolio(Portfolio):
+    """
+    Портфель с событийным циклом по барам на плоских массивах и
+    семантикой ордеров Catalyst (см. описание модуля).
+
+    Требования:
+        strategy  - Объёкт Strategy с колонками short_mavg и long_mavg в сигналах
+        volume  - Целевая доля стоимости портфеля для order_target_percent.
+        capital - Объём средств на старте торговли.
+        maker - Комиссия лимитных ордеров.
+        taker - Комиссия рыночных ордеров.
+        order_type - Тип ордеров: 'market' или 'limit'.
+        spread - Проскальзывание рыночных ордеров (половина - в каждую сторону).
+        warmup - Число пропускаемых баров (по умолчанию long_window - 1 стратегии).
+    """
+
+    def __init__(self, strategy: Strategy = None, volume: float = 10, capital: float = 100000.0,
+                 maker: float = 0.00025, taker: float = 0.00075, order_type: str = 'market',
+                 spread: float = 0.0001, warmup: int = None):
+        assert order_type in ORDER_TYPES, order_type
+
+        self.symbol = strategy.get_symbol()
+        self.bars = strategy.get_bars()
+        self.signals = strategy.get_signals()
+        self.capital = float(capital)
+        self.volume = volume
+        self.maker = maker
+        self.taker = taker
+        self.order_type = order_type
+        self.spread = spread
+
+        if warmup is None:
+            warmup = getattr(strategy, 'long_window', 1) - 1
+        self.warmup = warmup
+
+        self.portfolio = None
+        self.transactions = None
+
+    def backtest(self):
+        # Списки python в цикле быстрее поэлементного доступа к массивам numpy
+        close = self.bars['close'].to_numpy(dtype='float64').tolist()
+        short_mavg = self.signals['short_mavg'].to_numpy(dtype='float64').tolist()
+        long_mavg = self.signals['long_mavg'].to_numpy(dtype='float64').tolist()
+        n = len(close)
+
+        market = self.order_type == 'market'
+        fee = self.taker if market else self.maker
+        half_spread = self.spread / 2
+
+        cash = np.empty(n)
+        amount = np.empty(n)
+        value = np.empty(n)
+        price_change = np.zeros(n)
+        fills = []
+
+        position = 0.0
+        money = self.capital
+        # Открытый ордер: (бар выставления, объём, лимитная цена)
+        order = None
+        base_price = None
+
+        for i in range(n):
+            price = close[i]
+
+            # Исполнение ордера, выставленного на предыдущих барах
+            if order is not None:
+                placed, size, limit = order
+                if market:
+                    fill = price * (1 + half_spread if size > 0 else 1 - half_spread)
+                elif (size > 0 and price <= limit) or (size < 0 and price >= limit):
+                    fill = limit
+                else:
+                    fill = None
+
+                if fill is not None:
+                    commission = abs(size) * fill * fee
+                    money -= size * fill + commission
+                    position += size
+                    fills.append((i, placed, size, fill, commission))
+                    order = None
+
+            portfolio_value = money + position * price
+
+            if i >= self.warmup:
+                if base_price is None:
+                    base_price = price
+                price_change[i] = (price - base_price) / base_price
+
+                # Пока есть открытый ордер, ждём его исполнения
+                if order is None:
+                    if short_mavg[i] > long_mavg[i] and position == 0:
+                        size = self.volume * portfolio_value / price
+                    elif short_mavg[i] < long_mavg[i] and position > 0:
+                        size = -position
+                    else:
+                        size = 0.0
+
+                    if size != 0.0:
+                        order = (i, size, price)
+
+            cash[i] = money
+            amount[i] = position
+            value[i] = portfolio_value
+
+        index = self.bars.index
+        self.portfolio = pd.DataFrame({
+            'open': self.bars['open'].values,
+            'high': self.bars['high'].values,
+            'low': self.bars['low'].values,
+            'close': self.bars['close'].values,
+            'short_mavg': short_mavg,
+            'long_mavg': long_mavg,
+            'amount': amount,
+            'cash': cash,
+            'portfolio_value': value,
+            'price_change': price_change,
+        }, index=index)
+
+        fills = np.array(fills, dtype='float64').reshape(-1, 5)
+        self.transactions = pd.DataFrame({
+            'order_time': index[fills[:, 1].astype('int64')],
+            'amount': fills[:, 2],
+            'price': fills[:, 3],
+            'commission': fills[:, 4],
+        }, index=index[fills[:, 0].astype('int64')])
+
+    def get_portfolio(self):
+        return self.portfolio
+
+    def get_transactions(self):
+        """
+        Возвращает DataFrame исполненных сделок (время исполнения, время
+        выставления ордера, объём, цена, комиссия).
+        """
+        return self.transactions
@@ -0,0 +1,115 @@
+"""
+Бенчмарк загрузчика DataReaderBitmex на локальной замене BitMex (bitmexstub.py).
+
+Измеряет время загрузки периода в кэш, пропускную способность
+(сутки и бары в секунду) и число запросов на одни закэшированные сутки
+при разном числе потоков. С --extension так же прогоняется загрузка
+минутных баров бандла zipline (extension._get_minute_bar, нужен zipline).
+Сеть не нужна.
+
+    python3 bench_downloader.py --days 30 --workers 1 2 4 8 --latency 0.05
+    python3 bench_downloader.py --days 3 --extension
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+import pandas as pd
+
+import datareaderbitmex as drbitmex
+from bitmexstub import StandInBitmex, BASE_PATH
+
+
+def run(days: int, data_frequency: str, workers: int, latency: float,
+        limit: int, period: float, error_429: float, error_503: float):
+    """
+    Метод одного прогона загрузки в пустой кэш.
+    Возвращает словарь с результатами измерений.
+    """
+    start_time = pd.Timestamp('2018-06-01', tz='UTC')
+    end_time = start_time + pd.Timedelta(days=days)
+
+    with tempfile.TemporaryDirectory() as path_cache, \
+            StandInBitmex(latency=latency, limit=limit, period=period,
+                          error_429=error_429, error_503=error_503) as stub:
+
+        dR = drbitmex.DataReaderBitmex(path_cash=path_cache,
+                                       data_frequency=data_frequency,
+                                       workers=workers,
+                                       host=stub.get_url())
+        # Ведро читателя под лимит сервера-заглушки
+        dR.limiter = drbitmex.RateLimiter(limit=limit, period=period)
+
+        t = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            dR.load_to_cache(start_time, end_time)
+        seconds = time.perf_counter() - t
+
+        stats = stub.get_stats()
+
+    return {
+        'workers': workers,
+        'seconds': seconds,
+        'days/s': days / seconds,
+        'bars/s': stats['rows'] / seconds,
+        'requests/day': stats['requests'] / days,
+        '429': stats['rate_limited'] + stats['injected_429'],
+        '503': stats['injected_503'],
+    }
+
+
+def run_extension(days: int, latency: float, limit: int, period: float):
+    """
+    Метод прогона загрузки минутных баров бандла zipline (extension.py)
+    по суткам. Возвращает словарь с результатами измерений.
+    """
+    import extension
+
+    start_time = pd.Timestamp('2018-06-01', tz='UTC')
+
+    with StandInBitmex(latency=latency, limit=limit, period=period) as stub:
+        url = stub.get_url() + BASE_PATH
+
+        t = time.perf_counter()
+        bars = sum(len(extension._get_minute_bar('XBTUSD', start_time + pd.Timedelta(days=day), url))
+                   for day in range(days))
+        seconds = time.perf_counter() - t
+
+        stats = stub.get_stats()
+
+    return {
+        'loader': 'extension',
+        'seconds': seconds,
+        'days/s': days / seconds,
+        'bars/s': bars / seconds,
+        'requests/day': stats['requests'] / days,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Бенчмарк загрузчика данных BitMex')
+    parser.add_argument('--days', type=int, default=10)
+    parser.add_argument('--bin', default='1m')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--limit', type=int, default=60)
+    parser.add_argument('--period', type=float, default=6.0)
+    parser.add_argument('--error-429', type=float, default=0.0)
+    parser.add_argument('--error-503', type=float, default=0.0)
+    parser.add_argument('--extension', action='store_true',
+                        help='Загрузка минутных баров бандла zipline (extension.py)')
+    args = parser.parse_args()
+
+    if args.extension:
+        results = pd.DataFrame([
+            run_extension(args.days, args.latency, args.limit, args.period)
+        ]).set_index('loader')
+    else:
+        results = pd.DataFrame([
+            run(args.days, args.bin, workers, args.latency, args.limit,
+                args.period, args.error_429, args.error_503)
+            for workers in args.workers
+        ]).set_index('workers')
+
+    print(results.round(2).to_string())
@@ -0,0 +1,91 @@
+"""
+Бенчмарк ядер скользящих средних (indicators.py) против pandas.
+
+На синтетическом ряде цен, кратных шагу 0.5 (как у XBTUSD), измеряет время
+расчёта SMA, EMA и WMA для нескольких окон и наибольшее расхождение с
+rolling().mean(), ewm(span, adjust=False).mean() и rolling().apply() с весами.
+По умолчанию ряд - год минутных баров. Сеть не нужна.
+
+    python3 bench_indicators.py --bars 525600 --windows 10 40 100 1000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+import indicators
+
+
+def make_close(bars: int, tick: float = 0.5, seed: int = 0):
+    """
+    Метод построения случайного блуждания цен, кратных шагу tick.
+    """
+    rng = np.random.default_rng(seed)
+    steps = rng.integers(-4, 5, size=bars)
+    return pd.Series(7000.0 + tick * np.cumsum(steps))
+
+
+def _pandas_wma(close: pd.Series, window: int):
+    weights = np.arange(1, window + 1, dtype='float64')
+
+    def mean(values):
+        # Пока баров меньше окна, веса 1, 2, ..., число баров
+        w = weights[:len(values)]
+        return np.dot(values, w) / w.sum()
+
+    return close.rolling(window, min_periods=1).apply(mean, raw=True)
+
+
+# Эталоны pandas для каждого типа средней
+REFERENCES = {
+    'sma': lambda close, window: close.rolling(window, min_periods=1).mean(),
+    'ema': lambda close, window: close.ewm(span=window, adjust=False).mean(),
+    'wma': _pandas_wma,
+}
+
+
+def run(close: pd.Series, ma_type: str, windows: list, reference: bool = True):
+    """
+    Метод одного прогона: все окна ядром indicators и по одному окну в pandas.
+    Возвращает словарь с результатами измерений.
+    """
+    t = time.perf_counter()
+    result = indicators.moving_average(close, windows, ma_type)
+    seconds = time.perf_counter() - t
+
+    row = {'ma_type': ma_type, 'bars': len(close), 'windows': len(windows),
+           'seconds': seconds, 'bars/s': len(close) * len(windows) / seconds}
+
+    if reference:
+        t = time.perf_counter()
+        expected = np.column_stack([REFERENCES[ma_type](close, window) for window in windows])
+        row['pandas_seconds'] = time.perf_counter() - t
+        row['speedup'] = row['pandas_seconds'] / seconds
+        row['max_error'] = np.abs(result - expected).max(initial=0.0)
+
+    return row
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Бенчмарк ядер скользящих средних')
+    parser.add_argument('--bars', type=int, default=365 * 24 * 60)
+    parser.add_argument('--windows', type=int, nargs='+', default=[10, 40, 100, 1000])
+    parser.add_argument('--types', nargs='+', default=list(indicators.MA_TYPES),
+                        choices=indicators.MA_TYPES)
+    parser.add_argument('--tick', type=float, default=0.5,
+                        help='Шаг цены; 0 - цены без шага (суммирование во float)')
+    parser.add_argument('--no-wma-reference', action='store_true',
+                        help='Не сверять WMA с медленным rolling().apply()')
+    args = parser.parse_args()
+
+    close = make_close(args.bars, tick=args.tick or 0.5)
+    if not args.tick:
+        close = close + np.random.default_rng(1).normal(scale=0.01, size=len(close))
+
+    results = pd.DataFrame([
+        run(close, ma_type, args.windows,
+            reference=not (ma_type == 'wma' and args.no_wma_reference))
+        for ma_type in args.types
+    ]).set_index('ma_type')
+
+    print(results.to_string())
@@ -0,0 +1,448 @@
+"""
+Локальная замена REST API BitMex для тестов без сети.
+
+Сервер отдаёт эндпоинты /trade/bucketed и /instrument, описание API
+/api/explorer/swagger.json (по нему строится клиент bravado), эмулирует
+лимит запросов с заголовками x-ratelimit-*, ошибки 429 с retry-after и
+503, а также задержку ответа.
+"""
+import json
+import math
+import random
+import threading
+import time
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from datareaderbitmex import bin_minutes, resample_bars, slice_bars, normalize_bars
+
+BASE_PATH = '/api/v1'
+
+# Минимальное описание API для клиента bravado (только используемые операции)
+SWAGGER_SPEC = {
+    'swagger': '2.0',
+    'info': {'title': 'BitMEX stand-in', 'version': '1.2.0'},
+    'basePath': BASE_PATH,
+    'schemes': ['http'],
+    'consumes': ['application/json'],
+    'produces': ['application/json'],
+    'paths': {
+        '/trade/bucketed': {
+            'get': {
+                'tags': ['Trade'],
+                'operationId': 'Trade.getBucketed',
+                'parameters': [
+                    {'name': 'binSize', 'in': 'query', 'type': 'string'},
+                    {'name': 'partial', 'in': 'query', 'type': 'boolean'},
+                    {'name': 'symbol', 'in': 'query', 'type': 'string'},
+                    {'name': 'count', 'in': 'query', 'type': 'number', 'format': 'int32'},
+                    {'name': 'start', 'in': 'query', 'type': 'number', 'format': 'int32'},
+                    {'name': 'reverse', 'in': 'query', 'type': 'boolean'},
+                    {'name': 'startTime', 'in': 'query', 'type': 'string', 'format': 'date-time'},
+                    {'name': 'endTime', 'in': 'query', 'type': 'string', 'format': 'date-time'},
+                ],
+                'responses': {
+                    '200': {
+                        'description': 'Request was successful',
+                        'schema': {'type': 'array', 'items': {'$ref': '#/definitions/TradeBin'}},
+                    },
+                },
+            },
+        },
+        '/instrument': {
+            'get': {
+                'tags': ['Instrument'],
+                'operationId': 'Instrument.get',
+                'parameters': [
+                    {'name': 'symbol', 'in': 'query', 'type': 'string'},
+                ],
+                'responses': {
+                    '200': {
+                        'description': 'Request was successful',
+                        'schema': {'type': 'array', 'items': {'type': 'object'}},
+                    },
+                },
+            },
+        },
+    },
+    'definitions': {
+        'TradeBin': {
+            'type': 'object',
+            'properties': {
+                'timestamp': {'type': 'string', 'format': 'date-time'},
+                'symbol': {'type': 'string'},
+                'open': {'type': 'number', 'format': 'double'},
+                'high': {'type': 'number', 'format': 'double'},
+                'low': {'type': 'number', 'format': 'double'},
+                'close': {'type': 'number', 'format': 'double'},
+                'trades': {'type': 'number', 'format': 'int64'},
+                'volume': {'type': 'number', 'format': 'int64'},
+                'vwap': {'type': 'number', 'format': 'double'},
+                'lastSize': {'type': 'number', 'format': 'int64'},
+                'turnover': {'type': 'number', 'format': 'int64'},
+                'homeNotional': {'type': 'number', 'format': 'double'},
+                'foreignNotional': {'type': 'number', 'format': 'double'},
+            },
+        },
+    },
+}
+
+
+# Поля записи TradeBin после timestamp и symbol, в порядке ответа BitMex
+TRADE_BIN_COLUMNS = ['open', 'high', 'low', 'close', 'trades', 'volume', 'vwap',
+                     'lastSize', 'turnover', 'homeNotional', 'foreignNotional']
+
+# Поля TradeBin, которые при укрупнении баров складываются
+SUM_COLUMNS = ['trades', 'volume', 'turnover', 'homeNotional', 'foreignNotional']
+
+
+def trade_bins(minutes: pd.DataFrame):
+    """
+    Метод дополнения минутных баров OHLCV остальными полями TradeBin.
+    Контракты считаются инверсными, как XBTUSD: объём в долларах
+    (foreignNotional), homeNotional - в XBT, turnover - в сатоши.
+    Для баров без сделок vwap и lastSize пустые, как у BitMex.
+    minutes - Минутные бары (тип: pd.DataFrame()); trades, если колонки нет,
+              считается по одной сделке на минуту с объёмом
+    """
+    df = minutes.copy()
+    volume = df['volume'].to_numpy(dtype='int64')
+    if 'trades' not in df.columns:
+        df['trades'] = (volume > 0).astype('int64')
+    trades = df['trades'].to_numpy(dtype='int64')
+
+    traded = volume > 0
+    vwap = (df['high'].to_numpy(dtype='float64') + df['low'].to_numpy(dtype='float64') +
+            2.0 * df['close'].to_numpy(dtype='float64')) / 4.0
+    home = np.where(traded, volume / vwap, 0.0)
+
+    df['vwap'] = np.where(traded, vwap, np.nan)
+    df['lastSize'] = np.where(traded, volume // np.maximum(trades, 1), np.nan)
+    df['turnover'] = np.round(home * 1e8).astype('int64')
+    df['homeNotional'] = home
+    df['foreignNotional'] = volume.astype('float64')
+    return df
+
+
+def resample_trade_bins(minutes: pd.DataFrame, data_frequency: str):
+    """
+    Метод построения более крупных баров TradeBin из минутных (trade_bins()):
+    OHLCV - как resample_bars(), суммируемые поля складываются, lastSize -
+    последней минуты со сделками, vwap - средняя цена по объёму.
+    minutes        - Минутные бары со всеми полями TradeBin
+    data_frequency - Частота результирующих баров
+    """
+    df = resample_bars(minutes[['open', 'high', 'low', 'close', 'volume']], data_frequency)
+
+    # Метки совпадают с resample_bars(): граница интервала, выровненная по эпохе
+    groups = minutes.groupby(minutes.index.ceil(pd.Timedelta(minutes=bin_minutes(data_frequency))))
+    for column in SUM_COLUMNS:
+        df[column] = groups[column].sum().to_numpy()
+    df['lastSize'] = groups['lastSize'].last().to_numpy()
+
+    home = df['homeNotional'].to_numpy(dtype='float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        df['vwap'] = np.where(home > 0, df['foreignNotional'].to_numpy(dtype='float64') / home, np.nan)
+    return df
+
+
+def _number(value):
+    # Пустые значения (NaN) отдаются как null
+    return None if value != value else float(value)
+
+
+def synthetic_bars(symbol: str, start_time: pd.Timestamp, end_time: pd.Timestamp):
+    """
+    Метод построения детерминированных синтетических минутных баров
+    в диапазоне [start_time, end_time]. Одна и та же минута всегда
+    получает одни и те же значения, независимо от запрошенного диапазона.
+    symbol     - Символ (влияет на уровень цены)
+    start_time - Начальное время
+    end_time   - Конечное время
+    """
+    minute = 60 * 10**9
+    first = -(-start_time.value // minute)
+    last = end_time.value // minute
+    m = np.arange(first, last + 1, dtype='int64')
+
+    level = 1000.0 + sum(map(ord, symbol)) * 10.0
+    # Псевдослучайный шум, зависящий только от номера минуты
+    noise = np.modf(np.sin(m * 12.9898) * 43758.5453)[0]
+    close = level * (1.0 + 0.05 * np.sin(m / 1440.0)) + noise * 5.0
+    close = np.round(close * 2.0) / 2.0
+    open_ = np.r_[close[:1], close[:-1]]
+    spread = np.abs(noise) * 3.0
+
+    df = pd.DataFrame(
+        {
+            'symbol': symbol,
+            'open': open_,
+            'high': np.maximum(open_, close) + np.round(spread * 2.0) / 2.0,
+            'low': np.minimum(open_, close) - np.round(spread * 2.0) / 2.0,
+            'close': close,
+            'trades': (np.abs(noise) * 100).astype('int64') + 1,
+            'volume': (np.abs(noise) * 100000).astype('int64'),
+        },
+        index=pd.to_datetime(m * minute, utc=True)
+    )
+    df.index.name = 'last_traded'
+    return df
+
+
+class StandInBitmex:
+    """
+    Локальный сервер, отвечающий как REST API BitMex.
+
+    Требования:
+        bars      - Записанные минутные бары (тип: dict символ -> pd.DataFrame).
+                    Для символов без записи отдаются синтетические бары.
+        latency   - Задержка каждого ответа в секундах.
+        limit     - Число запросов за период (x-ratelimit-limit).
+        period    - Период восстановления лимита в секундах.
+        error_429 - Доля запросов, на которые отвечать 429 (помимо лимита).
+        error_503 - Доля запросов, на которые отвечать 503.
+        retry_after - Значение retry-after для искусственных ответов 429.
+        host, port - Адрес сервера (порт 0 - любой свободный).
+        seed      - Начальное значение генератора ошибок.
+    """
+
+    def __init__(self,
+                 bars: dict = None,
+                 latency: float = 0.0,
+                 limit: int = 30,
+                 period: float = 60.0,
+                 error_429: float = 0.0,
+                 error_503: float = 0.0,
+                 retry_after: int = 1,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 seed: int = 0):
+        self.bars = {symbol: normalize_bars(df) for symbol, df in (bars or {}).items()}
+        self.latency = latency
+        self.limit = limit
+        self.period = period
+        self.error_429 = error_429
+        self.error_503 = error_503
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.tokens = float(limit)
+        self.updated = time.time()
+        self.stats = {'requests': 0, 'ok': 0, 'rate_limited': 0,
+                      'injected_429': 0, 'injected_503': 0, 'rows': 0}
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    def get_url(self):
+        """
+        Метод получения адреса сервера (передаётся в DataReaderBitmex(host=...)).
+        """
+        host, port = self.server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def _take_token(self):
+        """
+        Метод учёта лимита запросов. Возвращает (разрешено, остаток, reset).
+        """
+        with self.lock:
+            now = time.time()
+            self.tokens = min(float(self.limit),
+                              self.tokens + (now - self.updated) * self.limit / self.period)
+            self.updated = now
+            self.stats['requests'] += 1
+
+            allowed = self.tokens >= 1.0
+            if allowed:
+                self.tokens -= 1.0
+
+            reset = int(math.ceil(now + (self.limit - self.tokens) * self.period / self.limit))
+            return allowed, int(self.tokens), reset
+
+    def _roll(self, rate: float):
+        with self.lock:
+            return self.random.random() < rate
+
+    def get_bucketed(self, params: dict):
+        """
+        Метод формирования ответа /trade/bucketed.
+        params - Параметры запроса
+        """
+        symbol = params.get('symbol', 'XBTUSD')
+        data_frequency = params.get('binSize', '1m')
+        count = min(int(params.get('count', 100)), 1000)
+        start = int(params.get('start', 0))
+        step = pd.Timedelta(minutes=bin_minutes(data_frequency))
+
+        end_time = pd.Timestamp(params['endTime']) if 'endTime' in params else pd.Timestamp.now(tz='UTC')
+        start_time = pd.Timestamp(params['startTime']) if 'startTime' in params else end_time - step * count
+        if start_time.tzinfo is None:
+            start_time = start_time.tz_localize('UTC')
+        if end_time.tzinfo is None:
+            end_time = end_time.tz_localize('UTC')
+        # Сервер не отдаёт будущих баров
+        end_time = min(end_time, pd.Timestamp.now(tz='UTC'))
+
+        # Минуты бара с меткой start_time начинаются раньше на один бар
+        if symbol in self.bars:
+            minutes = slice_bars(self.bars[symbol], start_time - step,
+                                 end_time + pd.Timedelta(minutes=1))
+        else:
+            minutes = synthetic_bars(symbol, start_time - step, end_time)
+
+        minutes = trade_bins(minutes)
+        if data_frequency == '1m':
+            df = minutes
+        else:
+            df = resample_trade_bins(minutes, data_frequency)
+
+        df = df.loc[(df.index >= start_time) & (df.index <= end_time)]
+        if params.get('reverse') == 'true':
+            df = df.iloc[::-1]
+        df = df.iloc[start:start + count]
+
+        return [
+            {
+                'timestamp': t.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                'symbol': symbol,
+                'open': float(o), 'high': float(h), 'low': float(l), 'close': float(c),
+                'trades': int(n), 'volume': int(v),
+                'vwap': _number(vwap),
+                'lastSize': None if size != size else int(size),
+                'turnover': int(turnover),
+                'homeNotional': float(home), 'foreignNotional': float(foreign),
+            }
+            for t, o, h, l, c, n, v, vwap, size, turnover, home, foreign in zip(
+                df.index, *(df[column].values for column in TRADE_BIN_COLUMNS))
+        ]
+
+    def get_instrument(self, params: dict):
+        """
+        Метод формирования ответа /instrument.
+        params - Параметры запроса
+        """
+        symbol = params.get('symbol', 'XBTUSD')
+        perpetual = symbol.endswith('USD')
+        return [{
+            'symbol': symbol,
+            'rootSymbol': symbol[:3],
+            'state': 'Open',
+            'typ': 'FFWCSX' if perpetual else 'FFCCSX',
+            'tickSize': 0.5 if symbol.startswith('XBT') else 0.05,
+            'expiry': None if perpetual else '2018-09-28T12:00:00.000Z',
+        }]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body, headers: dict = None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, str(value))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _error(self, status: int, name: str, message: str, headers: dict = None):
+                self._send(status, {'error': {'message': message, 'name': name}}, headers)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+                if url.path == '/api/explorer/swagger.json':
+                    self._send(200, SWAGGER_SPEC)
+                    return
+
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                allowed, remaining, reset = stub._take_token()
+                headers = {
+                    'x-ratelimit-limit': stub.limit,
+                    'x-ratelimit-remaining': remaining,
+                    'x-ratelimit-reset': reset,
+                }
+
+                if not allowed:
+                    with stub.lock:
+                        stub.stats['rate_limited'] += 1
+                    headers['retry-after'] = max(1, int(math.ceil(reset - time.time())))
+                    self._error(429, 'RateLimitError', 'Rate limit exceeded, retry later.', headers)
+                    return
+
+                if stub._roll(stub.error_429):
+                    with stub.lock:
+                        stub.stats['injected_429'] += 1
+                    headers['retry-after'] = stub.retry_after
+                    self._error(429, 'RateLimitError', 'Rate limit exceeded, retry later.', headers)
+                    return
+
+                if stub._roll(stub.error_503):
+                    with stub.lock:
+                        stub.stats['injected_503'] += 1
+                    self._error(503, 'HTTPError', 'The system is currently overloaded.', headers)
+                    return
+
+                if url.path == BASE_PATH + '/trade/bucketed':
+                    body = stub.get_bucketed(params)
+                elif url.path == BASE_PATH + '/instrument':
+                    body = stub.get_instrument(params)
+                else:
+                    self._error(404, 'HTTPError', 'Not Found', headers)
+                    return
+
+                with stub.lock:
+                    stub.stats['ok'] += 1
+                    stub.stats['rows'] += len(body)
+                self._send(200, body, headers)
+
+        return Handler
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Локальная замена REST API BitMex')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--limit', type=int, default=30)
+    parser.add_argument('--period', type=float, default=60.0)
+    parser.add_argument('--error-429', type=float, default=0.0)
+    parser.add_argument('--error-503', type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = StandInBitmex(latency=args.latency, limit=args.limit, period=args.period,
+                         error_429=args.error_429, error_503=args.error_503, port=args.port)
+    print('BitMex stand-in:', stub.get_url())
+    stub.server.serve_forever()
@@ -9,13 +9,24 @@ import logbook
 
 from catalyst import run_algorithm
 from catalyst.api import (record, symbol, sid, order_target_percent,)
-from catalyst.exchange.utils.stats_utils import extract_transactions
 
 import datareaderbitmex as drbitmex
+from downsample import DEFAULT_POINTS
+import report
+import resultexport
 
 NAMESPACE = 'moving_average_crossover'
 log = logbook.Logger(NAMESPACE)
 
+# Бюджет точек на график analyze() (None - все бары)
+ANALYZE_POINTS = DEFAULT_POINTS
+
+# Данные графиков analyze() в отдельном файле catalyst_analyze.data.js
+ANALYZE_SIDECAR = False
+
+# Страницы графиков analyze(): 'week', 'month' (None - одна страница)
+ANALYZE_PAGES = None
+
 
 def initialize(context):
     # Выбираем интесуемый акцив
@@ -110,181 +121,14 @@ def handle_data(context, data):
     )
 
 
-# Код взят из примера пока не расматривался.
 def analyze(context=None, results=None):
-    from plotly.offline import plot
-    import plotly.graph_objs as go
-
-    # Сохраним результаты в csv формате
-    results.to_csv('catalyst_portfolio.csv')
-
-    trans = extract_transactions(results)
-    buys  = trans[trans['amount'] > 0]
-    sells = trans[trans['amount'] < 0]
-
-    trans.to_csv('transaction.csv')
-    buys.to_csv('buys.csv')
-    sells.to_csv('sells.csv')
-  # Построение графика курсов акцивов
-    trace = go.Candlestick(
-        x=results.index,
-        open=results.open,
-        high=results.high,
-        low=results.low,
-        close=results.close,
-        increasing=dict(line=dict(width=1, color='#17BECF')),
-        decreasing=dict(line=dict(width=1, color='#7F7F7F')),
-        name='Курсы {}'.format(context.asset.asset_name),
-        yaxis='y2'
-    )
-
-    # График короткой скользящей средней
-    short_window = go.Scatter(
-        x=results.short_mavg.index,
-        y=results.short_mavg,
-        line=dict(
-            width=1,
-            color='rgba(60, 190, 60, 1.0)'
-        ),
-        name='40-дневная SMA',
-        yaxis='y2'
-    )
-
-    # График длинной скользящей средней
-    long_window = go.Scatter(
-        x=results.long_mavg.index,
-        y=results.long_mavg,
-        line=dict(
-            width=1,
-            color='rgba(180, 60, 170, 1.0)'
-        ),
-        name='100-дневная SMA',
-        yaxis='y2'
-    )
-
-    # График покупок акцивов
-    buy = go.Scatter(
-        x=results.short_mavg[buys.index].index,
-        y=results.short_mavg[buys.index],
-        mode='markers',
-        marker=dict(
-            symbol="triangle-up",
-            size=8,
-            #         color='rgba(250, 128, 114, .9)',
-             color='red',
-             line=dict(width=1, color='rgba(0, 0, 0, 1.0)')
-        ),
-        name='Покупка акцивов',
-        yaxis='y2'
-    )
-
-    # ПГрафик продажи акцивов
-    sell = go.Scatter(
-        x=results.short_mavg[sells.index].index,
-        y=results.short_mavg[sells.index],
-        mode='markers',
-        marker=dict(
-            symbol="triangle-down",
-            size=8,
-            color='blue',
-            line=dict(width=1, color='black')
-        ),
-        name='Продажа акцивов',
-        yaxis='y2'
-    )
-
-    # График общего капитала при торгах
-    capital_total = go.Scatter(
-        x=results.portfolio_value.index,
-        y=results.portfolio_value,
-        line=dict(
-            width=1,
-            color='blue'
-        ),
-        name='Значение Portfolio в $',
-        yaxis='y1'
-    )
-
-    # График позиций - покупок на фоне общего капитала
-    capital_buy = go.Scatter(
-        x=results.portfolio_value[buys.index].index,
-        y=results.portfolio_value[buys.index],
-        mode='markers',
-        marker=dict(
-            symbol="triangle-up",
-            size=8,
-            color='red',
-            line=dict(width=1, color='rgba(0, 0, 0, 1.0)')
-        ),
-        name='Покупка акцивов',
-        yaxis='y1'
-    )
-
-    # График позиций - продаж на фоне общего капитала
-    capital_sell = go.Scatter(
-        x=results.portfolio_value[sells.index].index,
-        y=results.portfolio_value[sells.index],
-        mode='markers',
-        marker=dict(
-            symbol="triangle-down",
-            size=8,
-            color='black',
-            line=dict(width=1, color='blue')
-        ),
-        name='Продажа акцивов',
-        yaxis='y1'
-    )
-
-    # Создадим список наших постоенных графиков
-    data = [trace, short_window, long_window, buy,
-            sell, capital_total, capital_buy, capital_sell]
-
-    # Настройки общего графика
-    layout = go.Layout(
-        paper_bgcolor='rgb(234, 233, 241)',
-        plot_bgcolor='rgb(201, 187, 172)',
-        title='График бэк-теста стратегии Moving Average Crossover на данных биржи BitMex',
-        titlefont=dict(
-            family='Arial, sans-serif',
-            size=26,
-            color='black'
-        ),
-        xaxis=dict(
-            title='Дата',
-            titlefont=dict(
-                family='Arial, sans-serif',
-                size=18,
-                color='black'
-            ),
-            rangeslider=dict(
-                visible=True
-            ),
-            range=['2018-06-01 00:00:00', '2018-06-05 00:00:00'],
-            type='date'
-        ),
-        yaxis=dict(
-            title='Капитал $',
-            titlefont=dict(
-                family='Arial, sans-serif',
-                size=18,
-                color='black'
-            ),
-            domain=[0, 0.47]
-        ),
-        yaxis2=dict(
-            title='Kурсы {} $'.format(context.asset.asset_name),
-            titlefont=dict(
-                family='Arial, sans-serif',
-                size=18,
-                color='black'
-            ),
-            domain=[0.53, 1]
-        )
-    )
+    # Сохраним результаты в колоночном формате (resultexport.read_export)
+    resultexport.export_frame('catalyst_portfolio', results)
 
-    # В итоге сторим наш общийграфик (создаем html файл)
-    figure = go.Figure(data=data, layout=layout)
-    plot(figure, filename='pandas_analyze')
+    # Отчёт строится в отдельном процессе: Catalyst может завершаться
+    data = report.from_catalyst(results, context.asset.asset_name)
+    report.render_in_background(data, 'catalyst_analyze', points=ANALYZE_POINTS,
+                                sidecar=ANALYZE_SIDECAR, auto_open=True, pages=ANALYZE_PAGES)
 
 
 if __name__ == '__main__':
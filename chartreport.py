@@ -0,0 +1,242 @@
+"""
+Компактная запись графиков Plotly в HTML.
+
+plot() из plotly.offline встраивает в страницу каждую серию каждого графика
+как JSON-текст, а даты оси x - строками, отдельно для каждого графика. Здесь
+данные хранятся иначе:
+
+    - ось времени баров хранится один раз (миллисекунды, float64); график
+      ссылается на неё номерами строк (int32), одинаковые наборы строк
+      хранятся один раз;
+    - числовые серии - двоичные массивы (по умолчанию float32);
+    - все массивы склеиваются в один блок base64 и разбираются в странице
+      в типизированные массивы JavaScript, которые Plotly принимает как есть.
+
+Данные читаются после загрузки страницы: из блока внутри HTML или из
+отдельного файла <имя>.data.js рядом с ним (sidecar=True). Библиотека
+plotly.js по умолчанию пишется один раз в plotly.min.js рядом со страницами.
+"""
+import base64
+import hashlib
+import json
+import webbrowser
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from os import path, makedirs, replace, getpid
+
+# Файл plotly.js рядом со страницами (plotlyjs='directory')
+PLOTLYJS_FILE = 'plotly.min.js'
+
+# Типы массивов и соответствующие им типизированные массивы JavaScript
+DTYPES = {'float32': '<f4', 'float64': '<f8', 'int32': '<i4'}
+
+_SCRIPT = """
+(function () {
+  var TYPES = {float32: Float32Array, float64: Float64Array, int32: Int32Array};
+
+  function decode(data) {
+    var text = atob(data), bytes = new Uint8Array(text.length);
+    for (var i = 0; i < text.length; i++) bytes[i] = text.charCodeAt(i);
+    return bytes.buffer;
+  }
+
+  window.renderChart = function (meta, data) {
+    var buffer = decode(data), arrays = {}, gathered = {};
+    Object.keys(meta.arrays).forEach(function (key) {
+      var a = meta.arrays[key];
+      arrays[key] = new TYPES[a[0]](buffer, a[1], a[2]);
+    });
+    var time = arrays[meta.time];
+
+    function resolve(value) {
+      if (Array.isArray(value)) return value.map(resolve);
+      if (value === null || typeof value !== 'object') return value;
+      if ('$rows' in value) {
+        var key = value.$rows;
+        if (key === null) return time;
+        if (!(key in gathered)) {
+          var rows = arrays[key], x = new Float64Array(rows.length);
+          for (var i = 0; i < rows.length; i++) x[i] = time[rows[i]];
+          gathered[key] = x;
+        }
+        return gathered[key];
+      }
+      if ('$values' in value) return arrays[value.$values];
+      var out = {};
+      Object.keys(value).forEach(function (k) { out[k] = resolve(value[k]); });
+      return out;
+    }
+
+    var div = document.getElementById(meta.div);
+    div.innerHTML = '';
+    Plotly.newPlot(div, resolve(meta.traces), meta.layout);
+  };
+
+  window.addEventListener('load', function () {
+    setTimeout(function () {
+      var payload = document.getElementById('chart-payload');
+      if (payload !== null) {
+        var content = JSON.parse(payload.textContent);
+        window.renderChart(content.meta, content.data);
+      } else {
+        var script = document.createElement('script');
+        script.src = document.body.getAttribute('data-payload');
+        document.body.appendChild(script);
+      }
+    }, 0);
+  });
+})();
+"""
+
+
+def _json(value):
+    # JSON внутри <script>: '</' не должен закрыть тег
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+
+
+def write_plotlyjs(folder: str):
+    """
+    Метод записи plotly.js в файл plotly.min.js каталога, если его там нет.
+    Запись атомарная: страницы могут писаться в каталог параллельно.
+    folder - Каталог страниц
+    """
+    from plotly.offline import get_plotlyjs
+
+    pt = path.join(folder, PLOTLYJS_FILE)
+    if not path.exists(pt):
+        makedirs(folder, exist_ok=True)
+        tmp = '{}.{}.tmp'.format(pt, getpid())
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+        replace(tmp, pt)
+
+    return pt
+
+
+class ChartReport:
+    """
+    Страница с графиками Plotly над общей осью времени баров.
+
+    Графики описываются словарями Plotly (как go.Scatter, go.Candlestick),
+    в которых вместо массивов стоят ссылки: x(метки) - точки оси времени,
+    y(значения) - числовая серия.
+
+    Требования:
+        index - Ось времени баров (тип: pd.DatetimeIndex), метки уникальны
+        dtype - Тип числовых серий: 'float32' (по умолчанию) или 'float64'
+    """
+
+    def __init__(self, index: pd.DatetimeIndex, dtype: str = 'float32'):
+        assert dtype in DTYPES, dtype
+        self.index = pd.DatetimeIndex(index)
+        self.dtype = dtype
+
+        self.arrays = OrderedDict()
+        self.rows = {}
+        self.traces = []
+
+        time = self.index.values.astype('datetime64[ns]').view('int64') / 1e6
+        self.time = self._add(time, 'float64')
+
+    def _add(self, values: np.ndarray, dtype: str):
+        key = 'a{}'.format(len(self.arrays))
+        self.arrays[key] = (dtype, np.ascontiguousarray(values, dtype=DTYPES[dtype]))
+        return key
+
+    def x(self, labels=None):
+        """
+        Метод получения ссылки на точки оси времени.
+        labels - Метки времени (по умолчанию вся ось)
+        """
+        if labels is None or (len(labels) == len(self.index) and self.index.equals(labels)):
+            return {'$rows': None}
+
+        rows = self.index.get_indexer(labels)
+        assert (rows >= 0).all(), 'Метки вне оси времени'
+
+        rows = rows.astype('int32')
+        digest = hashlib.blake2b(rows.tobytes(), digest_size=16).digest()
+        if digest not in self.rows:
+            self.rows[digest] = self._add(rows, 'int32')
+
+        return {'$rows': self.rows[digest]}
+
+    def y(self, values, dtype: str = None):
+        """
+        Метод получения ссылки на числовую серию.
+        values - Значения (тип: pd.Series() или np.ndarray)
+        dtype  - Тип серии (по умолчанию тип страницы)
+        """
+        dtype = dtype or self.dtype
+        return {'$values': self._add(np.asarray(values, dtype='float64'), dtype)}
+
+    def add_trace(self, trace: dict):
+        """
+        Метод добавления графика: словарь Plotly со ссылками x() и y().
+        """
+        self.traces.append(trace)
+
+    def _payload(self, layout: dict, div: str):
+        meta = {'div': div, 'time': self.time, 'arrays': {},
+                'traces': self.traces, 'layout': layout}
+
+        # Массивы выравниваются по 8 байт: так требуют типизированные массивы
+        chunks = []
+        offset = 0
+        for key, (dtype, values) in self.arrays.items():
+            meta['arrays'][key] = [dtype, offset, len(values)]
+            data = values.tobytes()
+            chunks.append(data + b'\0' * (-len(data) % 8))
+            offset += len(chunks[-1])
+
+        return meta, base64.b64encode(b''.join(chunks)).decode('ascii')
+
+    def write(self, filename: str, layout: dict, sidecar: bool = False,
+              plotlyjs: str = 'directory', auto_open: bool = False):
+        """
+        Метод записи страницы. Возвращает путь к HTML файлу.
+        filename  - Имя файла (расширение .html добавляется при отсутствии)
+        layout    - Настройки общего графика (словарь Plotly)
+        sidecar   - Данные в отдельном файле <имя>.data.js
+        plotlyjs  - 'directory' - plotly.js в файле plotly.min.js рядом со
+                    страницей, 'inline' - внутри страницы
+        auto_open - Открыть страницу в браузере
+        """
+        from plotly.offline import get_plotlyjs
+
+        assert plotlyjs in ('directory', 'inline'), plotlyjs
+        if not filename.endswith('.html'):
+            filename += '.html'
+        filename = path.abspath(filename)
+        folder = path.dirname(filename)
+
+        if plotlyjs == 'directory':
+            write_plotlyjs(folder)
+            library = '<script src="{}"></script>'.format(PLOTLYJS_FILE)
+        else:
+            library = '<script>{}</script>'.format(get_plotlyjs())
+
+        meta, data = self._payload(layout, 'chart')
+
+        if sidecar:
+            name = path.basename(filename)[:-len('.html')] + '.data.js'
+            with open(path.join(folder, name), 'w', encoding='utf-8') as f:
+                f.write('window.renderChart({}, "{}");\n'.format(_json(meta), data))
+            body = '<body data-payload="{}">'.format(name)
+            payload = ''
+        else:
+            body = '<body>'
+            payload = '<script type="application/json" id="chart-payload">{}</script>'.format(
+                _json({'meta': meta, 'data': data}))
+
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write('<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8">{}</head>\n'.format(library))
+            f.write('{}\n<div id="chart" style="height:100vh">Загрузка данных...</div>\n'.format(body))
+            f.write(payload)
+            f.write('\n<script>{}</script>\n</body>\n</html>\n'.format(_SCRIPT))
+
+        if auto_open:
+            webbrowser.open('file://' + filename)
+
+        return filename
@@ -0,0 +1,88 @@
+"""
+Проверка совпадения быстрого бэк-теста arraybacktest.py с результатами Catalyst.
+
+Сначала нужно прогнать catalyst_ma_crossover.py (см. run_test.sh), который
+выгружает результаты в каталог catalyst_portfolio (resultexport.py; можно
+указать и CSV прежнего формата). Скрипт повторяет тот же бэк-тест на
+закэшированных минутных данных XBTUSD и сравнивает стоимость портфеля и
+число сделок. При расхождении больше допуска завершается с кодом 1.
+
+    python3 check_catalyst.py --results catalyst_portfolio --rtol 0.01
+"""
+import argparse
+import sys
+from os import path
+import numpy as np
+import pandas as pd
+
+import datareaderbitmex as drbitmex
+import resultexport
+from arraybacktest import HistoryMovingAverageCrossStrategy, ArrayPortfolio
+
+
+def compare(results: pd.DataFrame, portfolio: pd.DataFrame, transactions: pd.DataFrame):
+    """
+    Метод сравнения результатов Catalyst и ArrayPortfolio на общих барах.
+    Возвращает словарь с наибольшим относительным расхождением стоимости
+    портфеля, итоговыми стоимостями и числом сделок.
+    results      - Результаты run_algorithm() Catalyst (тип: pd.DataFrame())
+    portfolio    - ArrayPortfolio.get_portfolio()
+    transactions - ArrayPortfolio.get_transactions()
+    """
+    index = results.index.intersection(portfolio.index)
+
+    expected = results.loc[index, 'portfolio_value'].to_numpy(dtype='float64')
+    actual = portfolio.loc[index, 'portfolio_value'].to_numpy(dtype='float64')
+
+    # Вложенная колонка transactions - списки (в csv - строки): '[]' - сделок нет
+    trades = int((results['transactions'].astype(str) != '[]').sum()) \
+        if 'transactions' in results.columns else None
+
+    return {
+        'bars': len(index),
+        'max_rel_error': float(np.max(np.abs(actual - expected) / np.abs(expected))) if len(index) else 0.0,
+        'catalyst_final': float(expected[-1]) if len(index) else None,
+        'array_final': float(actual[-1]) if len(index) else None,
+        'catalyst_trades': trades,
+        'array_trades': len(transactions),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сверка arraybacktest.py с Catalyst')
+    parser.add_argument('--results', default='catalyst_portfolio')
+    parser.add_argument('--cache', default='./cachebitmex')
+    parser.add_argument('--symbol', default='XBTUSD')
+    parser.add_argument('--start', default='2018-6-1')
+    parser.add_argument('--end', default='2018-9-1')
+    parser.add_argument('--capital', type=float, default=100000.0)
+    parser.add_argument('--rtol', type=float, default=0.01)
+    args = parser.parse_args()
+
+    if path.isdir(args.results):
+        # Из выгрузки читаются только нужные колонки
+        results = resultexport.read_export(args.results, columns=['portfolio_value', 'transactions'])
+    else:
+        results = pd.read_csv(args.results, index_col=0)
+        results.index = pd.to_datetime(results.index, utc=True)
+
+    dR = drbitmex.DataReaderBitmex(path_cash=args.cache,
+                                   symbol=args.symbol, data_frequency='1m')
+    bars = dR.get_bars(pd.to_datetime(args.start, utc=True),
+                       pd.to_datetime(args.end, utc=True))
+
+    # Те же параметры, что в catalyst_ma_crossover.py
+    strategy = HistoryMovingAverageCrossStrategy(symbol=args.symbol, bars=bars,
+                                                 short_window=40, long_window=100,
+                                                 minutes=5)
+    context = ArrayPortfolio(strategy=strategy, volume=10, capital=args.capital,
+                             maker=0.00025, taker=0.00075)
+    context.backtest()
+
+    report = compare(results, context.get_portfolio(), context.get_transactions())
+    for key, value in report.items():
+        print('{:>16}: {}'.format(key, value))
+
+    if report['max_rel_error'] > args.rtol:
+        print('Ошибка: расхождение с Catalyst больше допуска', args.rtol)
+        sys.exit(1)
@@ -0,0 +1,127 @@
+"""
+Проверка точной работы с ценами, кратными шагу цены BitMex.
+
+Цены берутся так, как они приходят от биржи - разбором десятичных строк
+(100.05, 299.9, ...), а не произведением числа шагов на шаг. Проверяется,
+что columnar.py находит шаг и восстанавливает цены без потерь,
+indicators.py суммирует такие цены точно в целых числах шагов, а потоковый
+бэк-тест stream_ma_crossover.py совпадает с пакетным побитово.
+Сеть и данные не нужны. При расхождении завершается с кодом 1.
+
+    python3 check_ticks.py
+"""
+import sys
+import tempfile
+from os import path
+import numpy as np
+import pandas as pd
+
+import columnar
+import indicators
+from pandas_ma_crossover import MovingAverageCrossStrategy, MarketOnClosePortfolio
+from stream_ma_crossover import MovingAverageCrossStream, STREAM_COLUMNS
+
+
+def make_prices(bars: int, tick: float, seed: int = 0):
+    """
+    Метод построения случайного блуждания цен с шагом tick,
+    разобранных из десятичных строк.
+    """
+    rng = np.random.default_rng(seed)
+    ticks = 2000 * columnar.tick_scale(tick) + np.cumsum(rng.integers(-4, 5, size=bars))
+    digits = max(0, int(round(-np.log10(tick))) + 1)
+    return np.array(['{:.{}f}'.format(k / columnar.tick_scale(tick), digits) for k in ticks],
+                    dtype='float64')
+
+
+def check_columnar(bars: int):
+    """
+    Метод проверки подбора шага и кодирования цен в columnar.py.
+    Возвращает список ошибок.
+    """
+    errors = []
+    for tick, dtype in [(0.5, 'float64'), (0.1, 'float64'), (0.05, 'float64'), (0.05, 'float32')]:
+        close = make_prices(bars, tick).astype(dtype)
+
+        found = columnar.tick_size(close)
+        if found != tick:
+            errors.append('tick_size: шаг {} вместо {} ({})'.format(found, tick, dtype))
+
+        with tempfile.TemporaryDirectory() as folder:
+            pt = path.join(folder, 'bars')
+            columnar.write_frame(pt, pd.DataFrame({'close': close}), ticks=['close'])
+            entry = columnar.read_meta(pt)['columns'][0]
+            restored = columnar.read_frame(pt)['close'].to_numpy()
+
+        if entry.get('tick') != tick:
+            errors.append('write_frame: шаг {} ({}) не записан'.format(tick, dtype))
+        if not np.array_equal(restored, close):
+            errors.append('read_frame: цены с шагом {} ({}) восстановлены не точно'.format(tick, dtype))
+
+    return errors
+
+
+def check_indicators(bars: int, windows: list):
+    """
+    Метод проверки точных средних indicators.sma(): результат должен совпадать
+    с rolling(min_periods=1).mean() по целым числам шагов, делённым на
+    число шагов в единице цены. Возвращает список ошибок.
+    """
+    errors = []
+    for tick in (0.5, 0.05):
+        close = make_prices(bars, tick)
+        scale = columnar.tick_scale(tick)
+        ticks = pd.Series(np.round(close * scale))
+
+        if indicators._prepare(close, bars)[1] != scale:
+            errors.append('indicators: цены с шагом {} суммируются во float'.format(tick))
+
+        result = indicators.sma(close, windows)
+        for k, window in enumerate(windows):
+            expected = ticks.rolling(window, min_periods=1).mean().to_numpy() / scale
+            if not np.array_equal(result[:, k], expected):
+                errors.append('sma({}) с шагом {}: расхождение {}'.format(
+                    window, tick, np.abs(result[:, k] - expected).max()))
+
+    return errors
+
+
+def check_stream(bars: int, chunk: int = 1440):
+    """
+    Метод сверки потокового бэк-теста (по суткам минутных баров) с пакетным
+    MarketOnClosePortfolio: колонки должны совпадать побитово.
+    Возвращает список ошибок.
+    """
+    errors = []
+    index = pd.date_range('2018-06-01', periods=bars, freq='1min', tz='UTC')
+    for tick in (0.5, 0.05):
+        close = make_prices(bars, tick, seed=1)
+        prices = pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close}, index=index)
+
+        strategy = MovingAverageCrossStrategy('XBTUSD', prices)
+        portfolio = MarketOnClosePortfolio(strategy)
+        portfolio.backtest()
+        expected = portfolio.get_portfolio().join(strategy.get_signals()[['short_mavg', 'long_mavg']])
+
+        stream = MovingAverageCrossStream('XBTUSD', tick=tick)
+        result = pd.concat([stream.extend(prices.iloc[start:start + chunk])
+                            for start in range(0, bars, chunk)])
+
+        for column in STREAM_COLUMNS:
+            a = result[column].to_numpy(dtype='float64')
+            b = expected[column].to_numpy(dtype='float64')
+            if not np.array_equal(a, b, equal_nan=True):
+                errors.append('stream {} с шагом {}: {} расхождений'.format(
+                    column, tick, int((~((a == b) | (np.isnan(a) & np.isnan(b)))).sum())))
+
+    return errors
+
+
+if __name__ == '__main__':
+    errors = check_columnar(100000) + check_indicators(200000, [10, 40, 100, 1000]) + \
+        check_stream(200000)
+
+    for error in errors:
+        print(error)
+    print('Ошибок:', len(errors))
+    sys.exit(1 if errors else 0)
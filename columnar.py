@@ -0,0 +1,325 @@
+"""
+Колоночный бинарный формат хранения DataFrame на диске.
+
+Блок данных - это каталог, в котором каждая колонка лежит в отдельном
+файле .npy, а описание блока (порядок колонок, индекс, атрибуты) - в _meta.json.
+Чтение не требует разбора текста: колонки загружаются напрямую в массивы numpy.
+
+Время хранится как int64 (наносекунды от эпохи Unix). Цены можно хранить
+целыми кратными шага цены (ticks), а файлы колонок - сжимать zstd или lz4
+(нужны пакеты zstandard или lz4). Колонки объектов, в которых есть не только
+строки (например вложенные списки сделок в результатах Catalyst), хранятся
+одним массивом JSON в кодировке UTF-8.
+
+Большие таблицы можно писать по частям: набор частей - это каталог с блоками
+part-00000, part-00001, ... (см. append_frame() и read_parts()).
+"""
+import io
+import json
+import numpy as np
+import pandas as pd
+from os import path, makedirs, replace, listdir
+from shutil import rmtree
+
+META_FILE = '_meta.json'
+INDEX_FILE = '__index__'
+
+# Префикс блоков набора частей
+PART_PREFIX = 'part-'
+
+# Поддерживаемые методы сжатия файлов колонок и расширения их файлов
+COMPRESSIONS = {None: '.npy', 'zstd': '.npy.zst', 'lz4': '.npy.lz4'}
+
+# Шаги цены, которые пробуются при кодировании цен целыми числами
+TICK_SIZES = (1.0, 0.5, 0.1, 0.05, 0.01, 0.005, 0.001, 0.0001, 0.00001, 0.000001, 0.00000001)
+
+# Допустимое отклонение цены от сетки шага, в долях шага
+TICK_TOLERANCE = 1e-6
+
+
+def is_frame(pt: str):
+    """
+    Метод проверки на существование колоночного блока.
+    pt - Путь к каталогу блока
+    """
+    return path.exists(path.join(pt, META_FILE))
+
+
+def _compress(data: bytes, compression: str):
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().compress(data)
+    if compression == 'lz4':
+        import lz4.frame
+        return lz4.frame.compress(data)
+    return data
+
+
+def _decompress(data: bytes, compression: str):
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == 'lz4':
+        import lz4.frame
+        return lz4.frame.decompress(data)
+    return data
+
+
+def tick_scale(tick: float):
+    """
+    Метод получения числа шагов цены в единице цены (1 / tick, целое).
+    Цены переводятся в шаги умножением на него, а обратно - делением:
+    2001 / 20 даёт ровно 100.05, а 2001 * 0.05 - нет.
+    tick - Шаг цены
+    """
+    return int(round(1.0 / tick))
+
+
+def tick_size(values: np.ndarray):
+    """
+    Метод подбора наибольшего шага цены, которому кратны все значения.
+    Возвращает None, если цены нельзя точно закодировать целыми числами.
+    Цены float64 сравниваются с сеткой с допуском TICK_TOLERANCE шага:
+    ошибки округления (2001 * 0.05 вместо 100.05) сетку не ломают.
+    values - Цены (тип: np.ndarray)
+    """
+    finite = values[np.isfinite(values)].astype('float64')
+    if len(finite) != len(values):
+        return None
+
+    for tick in TICK_SIZES:
+        scale = tick_scale(tick)
+        scaled = finite * scale
+        ticks = np.round(scaled)
+        if np.abs(ticks).max(initial=0) >= 2**31:
+            continue
+
+        if values.dtype == np.float64:
+            exact = np.abs(scaled - ticks).max(initial=0) < TICK_TOLERANCE
+        else:
+            # Цены меньшей точности (float32) должны точно восстанавливаться из шагов
+            exact = np.array_equal((ticks / scale).astype(values.dtype), values)
+        if exact:
+            return tick
+    return None
+
+
+def _to_array(values):
+    """
+    Приводит колонку к типизированному массиву numpy.
+    Время хранится как int64 наносекунд в UTC, строки - как строки фиксированной длины.
+    """
+    if isinstance(values, pd.DatetimeIndex) or pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.DatetimeIndex(values)
+        if values.tz is not None:
+            values = values.tz_convert('UTC').tz_localize(None)
+        return np.asarray(values, dtype='datetime64[ns]').view('int64'), 'UTC'
+
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = values.astype(str)
+    return values, None
+
+
+def _is_json(values: np.ndarray):
+    # Колонка объектов не только из строк: списки, словари, None, числа
+    return values.dtype == object and not all(isinstance(value, str) for value in values)
+
+
+def _encode_json(values: np.ndarray):
+    # Значения, которых нет в JSON (время, объекты), записываются строками
+    text = json.dumps(values.tolist(), default=str, separators=(',', ':'))
+    return np.frombuffer(text.encode('utf-8'), dtype='uint8')
+
+
+def _decode_json(data: np.ndarray):
+    items = json.loads(data.tobytes().decode('utf-8'))
+
+    # Поэлементно: иначе numpy развернёт вложенные списки в измерения массива
+    values = np.empty(len(items), dtype=object)
+    for i, item in enumerate(items):
+        values[i] = item
+    return values
+
+
+def _save(pt: str, name: str, values: np.ndarray, compression: str):
+    filename = name + COMPRESSIONS[compression]
+
+    if compression is None:
+        np.save(path.join(pt, filename), values)
+    else:
+        buffer = io.BytesIO()
+        np.save(buffer, values)
+        with open(path.join(pt, filename), 'wb') as f:
+            f.write(_compress(buffer.getvalue(), compression))
+
+    return filename
+
+
+def write_frame(pt: str, df: pd.DataFrame, attrs: dict = None,
+                compression: str = None, ticks: list = None):
+    """
+    Метод записи DataFrame в колоночный блок.
+    pt    - Путь к каталогу блока (создаётся, существующий перезаписывается)
+    df    - Данные
+    attrs - Дополнительные атрибуты блока (тип: dict)
+    compression - Сжатие файлов колонок: None, 'zstd' или 'lz4'
+    ticks - Колонки цен, которые хранить целыми кратными шага цены
+            (если значения нельзя закодировать точно, колонка хранится как есть)
+    """
+    assert compression in COMPRESSIONS, compression
+
+    tmp = pt + '.tmp'
+    if path.exists(tmp):
+        rmtree(tmp)
+    makedirs(tmp)
+
+    meta = {
+        'columns': [],
+        'rows': len(df),
+        'index': None,
+        'attrs': attrs or {},
+        'compression': compression,
+    }
+
+    values, tz = _to_array(df.index)
+    meta['index'] = {
+        'name': df.index.name,
+        'tz': tz,
+        'file': _save(tmp, INDEX_FILE, values, compression),
+    }
+
+    for column in df.columns:
+        if _is_json(np.asarray(df[column].values)):
+            entry = {'name': str(column), 'tz': None, 'dtype': '|O', 'json': True}
+            entry['file'] = _save(tmp, str(column), _encode_json(df[column].values), compression)
+            meta['columns'].append(entry)
+            continue
+
+        values, tz = _to_array(df[column].values)
+        entry = {'name': str(column), 'tz': tz, 'dtype': values.dtype.str}
+
+        if ticks and column in ticks and values.dtype.kind == 'f':
+            tick = tick_size(values)
+            if tick is not None:
+                values = np.round(values * tick_scale(tick)).astype('int32')
+                entry['tick'] = tick
+
+        entry['file'] = _save(tmp, str(column), values, compression)
+        meta['columns'].append(entry)
+
+    with open(path.join(tmp, META_FILE), 'w') as f:
+        json.dump(meta, f)
+
+    # Подменяем блок целиком, чтобы не оставить на диске наполовину записанных данных
+    if path.exists(pt):
+        rmtree(pt)
+    replace(tmp, pt)
+
+
+def read_meta(pt: str):
+    """
+    Метод чтения описания колоночного блока.
+    pt - Путь к каталогу блока
+    """
+    with open(path.join(pt, META_FILE)) as f:
+        return json.load(f)
+
+
+def _load(pt: str, entry: dict, compression: str, mmap: bool, float_dtype: str = None):
+    filename = entry.get('file', entry['name'] + '.npy')
+
+    if compression is None:
+        values = np.load(path.join(pt, filename), mmap_mode='r' if mmap else None)
+    else:
+        with open(path.join(pt, filename), 'rb') as f:
+            values = np.load(io.BytesIO(_decompress(f.read(), compression)))
+
+    if entry.get('tz') is not None:
+        return pd.DatetimeIndex(values.view('datetime64[ns]')).tz_localize(entry['tz'])
+
+    if entry.get('json'):
+        return _decode_json(values)
+
+    if 'tick' in entry:
+        values = values / tick_scale(entry['tick'])
+        values = values.astype(float_dtype or entry['dtype'], copy=False)
+    elif float_dtype is not None and values.dtype.kind == 'f':
+        values = values.astype(float_dtype, copy=False)
+
+    return values
+
+
+def read_frame(pt: str, columns: list = None, mmap: bool = False, float_dtype: str = None):
+    """
+    Метод чтения колоночного блока в DataFrame.
+    pt      - Путь к каталогу блока
+    columns - Список загружаемых колонок (по умолчанию все)
+    mmap    - Отображать файлы колонок в память вместо чтения (только без сжатия)
+    float_dtype - Тип, к которому привести колонки с плавающей точкой
+                  (например 'float32'), по умолчанию тип при записи
+    """
+    meta = read_meta(pt)
+    compression = meta.get('compression')
+
+    index = _load(pt, dict(meta['index'], name=INDEX_FILE), compression, mmap)
+    if not isinstance(index, pd.DatetimeIndex):
+        index = pd.Index(index)
+    index.name = meta['index']['name']
+
+    data = {}
+    for column in meta['columns']:
+        if columns is not None and column['name'] not in columns:
+            continue
+        data[column['name']] = _load(pt, column, compression, mmap, float_dtype)
+
+    df = pd.DataFrame(data, index=index)
+    df.attrs.update(meta['attrs'])
+    return df
+
+
+def list_parts(pt: str):
+    """
+    Метод получения путей к блокам набора частей по порядку.
+    pt - Путь к каталогу набора
+    """
+    if not path.exists(pt):
+        return []
+
+    names = sorted(name for name in listdir(pt) if name.startswith(PART_PREFIX))
+    return [path.join(pt, name) for name in names if is_frame(path.join(pt, name))]
+
+
+def append_frame(pt: str, df: pd.DataFrame, attrs: dict = None,
+                 compression: str = None, ticks: list = None):
+    """
+    Метод дописывания DataFrame очередной частью в набор частей.
+    Каталог набора создаётся при первой записи. Возвращает путь к новой части.
+    pt - Путь к каталогу набора
+    df - Данные
+    attrs, compression, ticks - как в write_frame()
+    """
+    makedirs(pt, exist_ok=True)
+
+    parts = list_parts(pt)
+    number = int(path.basename(parts[-1])[len(PART_PREFIX):]) + 1 if parts else 0
+
+    part = path.join(pt, '{}{:05d}'.format(PART_PREFIX, number))
+    write_frame(part, df, attrs=attrs, compression=compression, ticks=ticks)
+    return part
+
+
+def read_parts(pt: str, columns: list = None, mmap: bool = False, float_dtype: str = None):
+    """
+    Метод чтения набора частей в один DataFrame.
+    pt - Путь к каталогу набора
+    columns, mmap, float_dtype - как в read_frame()
+    """
+    frames = [read_frame(part, columns=columns, mmap=mmap, float_dtype=float_dtype)
+              for part in list_parts(pt)]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.concat(frames)
+    df.attrs.update(frames[0].attrs)
+    return df
@@ -6,9 +6,345 @@ import datetime as dt
 import bitmex as bm
 import pandas as pd
 import bravado
+from bravado.client import SwaggerClient
 import time
 import sys
-from os import path, mkdir
+import copy
+import threading
+from collections import OrderedDict
+import json
+import zlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from os import path, makedirs, listdir, remove, replace
+from shutil import rmtree
+
+import columnar
+
+# Поддерживаемые форматы кэша:
+#   csv - текстовый файл на каждые сутки <YYYY-MM-DD>.csv
+#   npy - колоночный бинарный блок на каждые сутки <YYYY-MM-DD>/ (см. columnar.py)
+CACHE_FORMATS = ('csv', 'npy')
+
+# Манифест кэша - описание каждых закэшированных суток в каталоге <symbol>/<binSize>
+MANIFEST_FILE = 'manifest.json'
+
+# Колонки, по которым считается контрольная сумма суток
+CHECKSUM_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+# Колонки баров, которые собираются в панель нескольких символов
+PANEL_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+# Колонки цен, которые в компактном виде хранятся кратными шага цены
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+
+# Частоты, которые отдаёт сервер BitMex. Остальные кратные минуте частоты
+# строятся локально из кэша '1m'.
+BITMEX_BIN_SIZES = ('1m', '5m', '1h', '1d')
+
+
+def bin_minutes(data_frequency: str):
+    """
+    Метод перевода частоты курсов ('1m', '5m', '1h', '1d', ...) в минуты.
+    data_frequency - Частота
+    """
+    units = {'m': 1, 'h': 60, 'd': 24*60}
+
+    assert data_frequency[-1] in units, data_frequency
+
+    return int(data_frequency[:-1]) * units[data_frequency[-1]]
+
+
+def time_index(index):
+    """
+    Метод приведения индекса к времени datetime64[ns, UTC].
+    index - Индекс (строки или время)
+    """
+    index = pd.to_datetime(index, utc=True)
+    index = pd.DatetimeIndex(index.values.astype('datetime64[ns]')).tz_localize('UTC')
+    index.name = 'last_traded'
+    return index
+
+
+def normalize_bars(df: pd.DataFrame):
+    """
+    Метод приведения баров к отсортированному индексу last_traded
+    типа datetime64[ns, UTC]. По такому индексу диапазон ищется
+    бинарным поиском (searchsorted) без сравнения строк.
+    df - Бары (тип: pd.DataFrame())
+    """
+    df = df.copy()
+    df.index = time_index(df.index)
+
+    if not df.index.is_monotonic_increasing:
+        df.sort_index(inplace=True, kind='mergesort')
+
+    return df
+
+
+def slice_bars(df: pd.DataFrame, start_time: pd.Timestamp = None, end_time: pd.Timestamp = None):
+    """
+    Метод выборки баров в диапазоне [start_time, end_time) бинарным поиском
+    по отсортированному индексу. Возвращается срез без копирования данных.
+    df - Бары с отсортированным индексом по времени
+    start_time - Начальное время (по умолчанию с начала)
+    end_time   - Конечное время (по умолчанию до конца)
+    """
+    i = 0 if start_time is None else df.index.searchsorted(start_time, side='left')
+    j = len(df) if end_time is None else df.index.searchsorted(end_time, side='left')
+
+    return df.iloc[i:j]
+
+
+def compact_bars(df: pd.DataFrame, symbol: str = None):
+    """
+    Метод перевода баров в компактный вид: цены float32, объём int64,
+    символ убирается из колонок в df.attrs['symbol'].
+    df     - Бары (тип: pd.DataFrame())
+    symbol - Символ (по умолчанию берётся из колонки symbol)
+    """
+    if 'symbol' in df.columns:
+        if symbol is None and len(df):
+            symbol = df['symbol'].iloc[0]
+        df = df.drop(columns='symbol')
+
+    df = df.astype({column: 'float32' for column in PRICE_COLUMNS if column in df.columns})
+    if 'volume' in df.columns:
+        df['volume'] = df['volume'].fillna(0).astype('int64')
+
+    df.attrs['symbol'] = symbol
+    return df
+
+
+def day_range(start_time: pd.Timestamp, end_time: pd.Timestamp):
+    """
+    Метод получения списка суток в диапазоне [start_time, end_time).
+    start_time - Начальное время
+    end_time   - Конечное время
+    """
+    days = pd.date_range(start_time, end_time, freq='D')
+    return days[days < end_time]
+
+
+def resample_bars(df: pd.DataFrame, data_frequency: str):
+    """
+    Метод векторного построения более крупных баров OHLCV из минутных.
+    Бары BitMex подписываются временем закрытия: бар с меткой t содержит
+    сделки из интервала (t - binSize, t]. Интервалы выровнены по эпохе Unix.
+    df - Минутные бары с индексом по времени (тип: pd.DataFrame())
+    data_frequency - Частота результирующих баров
+    """
+    step = bin_minutes(data_frequency) * 60 * 10**9
+
+    ts = time_index(df.index).values.view('int64')
+    # Метка бара - ближайшая сверху граница интервала
+    labels = -(-ts // step) * step
+
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], len(labels)] - 1
+
+    bars = pd.DataFrame(
+        {
+            'open': df['open'].values[starts],
+            'high': np.fmax.reduceat(df['high'].values, starts),
+            'low': np.fmin.reduceat(df['low'].values, starts),
+            'close': df['close'].values[ends],
+            'volume': np.add.reduceat(df['volume'].values, starts),
+        },
+        index=pd.to_datetime(labels[starts], utc=True)
+    )
+    bars.index.name = 'last_traded'
+
+    if 'symbol' in df.columns:
+        bars.insert(0, 'symbol', df['symbol'].values[ends])
+
+    return bars
+
+
+class RateLimiter:
+    """
+    Потокобезопасное "ведро токенов" для запросов к REST API BitMex.
+
+    Ведро пополняется со скоростью limit запросов за period секунд и
+    подстраивается под заголовки ответа сервера x-ratelimit-limit,
+    x-ratelimit-remaining, x-ratelimit-reset. При ошибке 429 все потоки
+    приостанавливаются на retry-after секунд.
+
+    Требования:
+        limit  - Начальное число запросов за период.
+        period - Период пополнения ведра в секундах.
+    """
+
+    def __init__(self, limit: int = 30, period: float = 60.0):
+        assert limit > 0 and period > 0, (limit, period)
+
+        self.lock = threading.Lock()
+        self.period = period
+        self.limit = limit
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(float(self.limit),
+                          self.tokens + (now - self.updated) * self.limit / self.period)
+        self.updated = now
+
+    def acquire(self):
+        """
+        Метод ожидания разрешения на один запрос.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                else:
+                    wait = (1.0 - self.tokens) * self.period / self.limit
+
+            time.sleep(wait)
+
+    def update(self, limit: int, remaining: int, reset: int):
+        """
+        Метод подстройки ведра под заголовки ответа сервера.
+        limit     - x-ratelimit-limit (не положительный - не учитывается)
+        remaining - x-ratelimit-remaining
+        reset     - x-ratelimit-reset (unix-время полного восстановления лимита)
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            # Нулевой лимит (заглушка, неполные заголовки) обнулил бы скорость ведра
+            if limit > 0:
+                self.limit = limit
+            # Сервер знает точнее: токенов не может быть больше, чем он разрешает
+            self.tokens = min(self.tokens, float(remaining))
+
+            if remaining == 0:
+                self.blocked_until = max(self.blocked_until,
+                                         time.monotonic() + max(0.0, reset - time.time()))
+
+    def pause(self, seconds: float):
+        """
+        Метод приостановки всех запросов (ошибка 429 с заголовком retry-after).
+        seconds - Время задержки в секундах
+        """
+        with self.lock:
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+            self.blocked_until = max(self.blocked_until, self.updated + seconds)
+
+
+# Лимит BitMex считается на IP/ключ, поэтому все читатели с одинаковым
+# подключением делят одно ведро.
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(test: bool = True, api_key: str = None, host: str = None):
+    """
+    Метод получения общего ведра токенов для подключения.
+    test    - Работать с bitmex в тестовом режиме.
+    api_key - Key зарегистрированного пользователя в bitmex.
+    host    - Адрес сервера, если это не BitMex (см. bitmexstub.py)
+    """
+    with _limiters_lock:
+        key = (host or test, api_key)
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(limit=30 if api_key is None else 60)
+        return _limiters[key]
+
+
+class DayCache:
+    """
+    Потокобезопасный LRU-кэш разобранных суток в памяти процесса.
+
+    Когда суммарный размер блоков превышает max_bytes, вытесняются
+    блоки, к которым дольше всего не обращались. Ведутся счётчики
+    попаданий, промахов и вытеснений.
+
+    Требования:
+        max_bytes - Бюджет памяти в байтах (0 - кэш отключён).
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.blocks = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Метод получения блока по ключу (None, если блока нет).
+        key - Ключ блока
+        """
+        with self.lock:
+            if key not in self.blocks:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.blocks.move_to_end(key)
+            return self.blocks[key][0]
+
+    def put(self, key, df: pd.DataFrame):
+        """
+        Метод добавления блока с вытеснением старых блоков сверх бюджета.
+        key - Ключ блока
+        df  - Блок данных
+        """
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            self._discard(key)
+            self.blocks[key] = (df, size)
+            self.bytes += size
+
+            while self.bytes > self.max_bytes:
+                _, (_, old_size) = self.blocks.popitem(last=False)
+                self.bytes -= old_size
+                self.evictions += 1
+
+    def _discard(self, key):
+        if key in self.blocks:
+            self.bytes -= self.blocks.pop(key)[1]
+
+    def discard(self, key):
+        """
+        Метод удаления блока (например, после перезаписи суток на диске).
+        key - Ключ блока
+        """
+        with self.lock:
+            self._discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.blocks.clear()
+            self.bytes = 0
+
+    def get_stats(self):
+        """
+        Метод получения счётчиков кэша.
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'blocks': len(self.blocks),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+            }
 
 
 class DataReaderBitmex:
@@ -22,6 +358,19 @@ class DataReaderBitmex:
         test - Работать с bitmex в тестовом режиме.
         api_key - Key зарегистрированного пользователя в bitmex.
         api_secret - Секретный код зарегистрированного пользователя в bitmex.
+        cache_format - Формат хранения кэша: 'csv' или 'npy' (колоночный бинарный).
+        derive - Строить частоты '5m', '1h', '1d' локально из кэша '1m', а не
+                 загружать их отдельно. Частоты, которых нет на BitMex
+                 (например '15m' или '4h'), строятся из '1m' всегда.
+        workers - Число потоков, параллельно загружающих сутки с сервера.
+        memory_budget - Бюджет памяти в байтах для LRU-кэша разобранных суток
+                        (0 - не держать сутки в памяти).
+        host - Адрес сервера с API BitMex вместо настоящей биржи, например
+               локальной замены из bitmexstub.py ('http://127.0.0.1:8000').
+        compact - Компактные бары: цены float32 (в кэше 'npy' - целые кратные
+                  шага цены), объём int64, символ не колонкой, а в df.attrs['symbol'].
+        compression - Сжатие файлов кэша 'npy': None, 'zstd' или 'lz4'
+                      (нужны пакеты zstandard или lz4).
     """
 
     def __init__(self,
@@ -30,17 +379,44 @@ class DataReaderBitmex:
                  data_frequency: str = '1m',
                  test: bool = True,
                  api_key: str = None,
-                 api_secret: str = None
+                 api_secret: str = None,
+                 cache_format: str = 'csv',
+                 derive: bool = False,
+                 workers: int = 4,
+                 memory_budget: int = 256 * 2**20,
+                 host: str = None,
+                 compact: bool = False,
+                 compression: str = None
                  ):
 
-        self.client = bm.bitmex(
-            test=test,
-            api_key=api_key,
-            api_secret=api_secret)
+        if host is None:
+            self.client = bm.bitmex(
+                test=test,
+                api_key=api_key,
+                api_secret=api_secret)
+        else:
+            # Те же настройки клиента, что и в bm.bitmex()
+            self.client = SwaggerClient.from_url(
+                host + '/api/explorer/swagger.json',
+                config={
+                    'use_models': False,
+                    'validate_responses': False,
+                    'also_return_response': True,
+                })
+        self.limiter = get_rate_limiter(test, api_key, host)
+        self.workers = workers
+        self.derive = derive
+        self.compact = compact
+        assert compression in columnar.COMPRESSIONS, compression
+        self.compression = compression
+        self.day_cache = DayCache(memory_budget)
+        self.manifests = {}
+        self.manifest_lock = threading.Lock()
 
         self.set_path(path_cash)
         self.set_symbol(symbol)
         self.set_binSize(data_frequency)
+        self.set_cache_format(cache_format)
 
     def set_path(self, path_cash: str):
         pt = path.abspath(path_cash)
@@ -57,8 +433,7 @@ class DataReaderBitmex:
     def set_symbol(self, symbol: str):
         pt = path.join(self.path_cash, symbol)
 
-        if not path.exists(pt):
-            mkdir(pt)
+        makedirs(pt, exist_ok=True)
 
         self.symbol = symbol
 
@@ -68,44 +443,270 @@ class DataReaderBitmex:
     def set_binSize(self, data_frequency: str):
         pt = path.join(self.path_cash, self.symbol, data_frequency)
 
-        if not path.exists(pt):
-            mkdir(pt)
+        makedirs(pt, exist_ok=True)
 
         self.data_frequency = data_frequency
 
     def get_binSize(self):
         return self.data_frequency
 
+    def is_derived(self):
+        """
+        Метод проверки, строится ли текущая частота из кэша '1m'.
+        """
+        if self.data_frequency == '1m':
+            return False
+        return self.derive or self.data_frequency not in BITMEX_BIN_SIZES
+
+    def get_base_reader(self):
+        """
+        Метод получения читателя минутного кэша того же символа,
+        из которого строятся производные частоты.
+        """
+        base = copy.copy(self)
+        base.set_binSize('1m')
+        return base
+
+    def set_cache_format(self, cache_format: str):
+        assert cache_format in CACHE_FORMATS, cache_format
+
+        self.cache_format = cache_format
+
+    def get_cache_format(self):
+        return self.cache_format
+
+    def get_day_path(self, day: pd.Timestamp, cache_format: str = None):
+        """
+        Метод получения пути к кэшу за сутки.
+        day - Дата
+        cache_format - Формат кэша (по умолчанию текущий формат)
+        """
+        if cache_format is None:
+            cache_format = self.cache_format
+
+        name = day.strftime("%Y-%m-%d")
+        if cache_format == 'csv':
+            name += '.csv'
+
+        return path.join(self.path_cash, self.symbol, self.data_frequency, name)
+
+    def get_manifest(self):
+        """
+        Метод получения манифеста кэша текущего символа и частоты.
+        Манифест читается с диска один раз и далее хранится в памяти.
+
+        Запись манифеста на каждые сутки (ключ - дата YYYY-MM-DD):
+            rows     - Число баров
+            first    - Время первого бара
+            last     - Время последнего бара
+            expected - Ожидаемое число баров за сутки
+            checksum - Контрольная сумма (crc32) колонок OHLCV
+            final    - Сутки закончились до загрузки, больше данных не будет
+            format   - Формат, в котором записаны сутки
+        """
+        pt = path.join(self.path_cash, self.symbol,
+                       self.data_frequency, MANIFEST_FILE)
+
+        with self.manifest_lock:
+            if pt not in self.manifests:
+                if path.exists(pt):
+                    with open(pt) as f:
+                        self.manifests[pt] = json.load(f)
+                else:
+                    self.manifests[pt] = {}
+            return self.manifests[pt]
+
+    def save_manifest(self):
+        """
+        Метод записи манифеста текущего символа и частоты на диск.
+        """
+        manifest = self.get_manifest()
+        pt = path.join(self.path_cash, self.symbol,
+                       self.data_frequency, MANIFEST_FILE)
+
+        with self.manifest_lock:
+            with open(pt + '.tmp', 'w') as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+            replace(pt + '.tmp', pt)
+
+    def expected_bars(self):
+        """
+        Метод получения ожидаемого числа баров за полные сутки.
+        """
+        return 24*60 // bin_minutes(self.data_frequency)
+
+    def update_manifest(self, day: pd.Timestamp, df: pd.DataFrame, final: bool = False):
+        """
+        Метод обновления записи манифеста за сутки.
+        day - Дата
+        df  - Данные за сутки
+        final - Сутки закончились до загрузки
+        """
+        index = time_index(df.index)
+        values = np.ascontiguousarray(
+            df[CHECKSUM_COLUMNS].to_numpy(dtype='float64'))
+
+        entry = {
+            'rows': len(df),
+            'first': index[0].isoformat() if len(df) else None,
+            'last': index[-1].isoformat() if len(df) else None,
+            'expected': self.expected_bars(),
+            'checksum': zlib.crc32(values.tobytes()),
+            'final': final,
+            'format': self.cache_format,
+        }
+
+        manifest = self.get_manifest()
+        with self.manifest_lock:
+            manifest[day.strftime("%Y-%m-%d")] = entry
+
+        self.save_manifest()
+
+        return entry
+
     def check_cache(self, day: pd.Timestamp):
         """
-        Метод проверки на существование за кешированных данных.
+        Метод проверки на существование и полноту за кешированных данных.
+        Проверка выполняется по манифесту, без открытия файлов кэша.
+        Сутки, закэшированные до появления манифеста, один раз читаются
+        и вносятся в манифест.
+        day - Дата
+        """
+        entry = self.get_manifest().get(day.strftime("%Y-%m-%d"))
+
+        if entry is not None and entry.get('format', 'csv') != self.cache_format:
+            # Сутки записаны в другом формате - перепишем их локально
+            if not path.exists(self.get_day_path(day, entry.get('format', 'csv'))):
+                return False
+            df = self.read_day(day, entry.get('format', 'csv'))
+            self.write_day(day, df)
+            entry = self.update_manifest(day, df, entry['final'])
+
+        if entry is None:
+            if not path.exists(self.get_day_path(day)):
+                return False
+            entry = self.update_manifest(day, self.read_day(day))
+
+        return entry['final'] or entry['rows'] >= entry['expected']
+
+    def write_day(self, day: pd.Timestamp, df: pd.DataFrame, cache_format: str = None):
+        """
+        Метод записи данных за сутки в кэш.
+        day - Дата
+        df  - Данные за сутки с индексом last_traded
+        cache_format - Формат кэша (по умолчанию текущий формат)
+        """
+        if cache_format is None:
+            cache_format = self.cache_format
+
+        # Время разбирается и сортируется один раз - при записи
+        df = normalize_bars(df)
+
+        pt = self.get_day_path(day, cache_format)
+        if cache_format == 'csv':
+            df.to_csv(pt)
+        elif self.compact:
+            columnar.write_frame(pt, compact_bars(df, self.symbol),
+                                 attrs={'symbol': self.symbol},
+                                 compression=self.compression,
+                                 ticks=PRICE_COLUMNS)
+        else:
+            columnar.write_frame(pt, df, compression=self.compression)
+
+        self.day_cache.discard(pt)
+
+    def read_day(self, day: pd.Timestamp, cache_format: str = None):
+        """
+        Метод чтения данных за сутки из кэша.
         day - Дата
-        TODO: Не реализованно проверка на полноту данных в файле.
+        cache_format - Формат кэша (по умолчанию текущий формат)
+        """
+        if cache_format is None:
+            cache_format = self.cache_format
+
+        pt = self.get_day_path(day, cache_format)
+
+        df = self.day_cache.get(pt)
+        if df is None:
+            if cache_format == 'csv':
+                df = pd.read_csv(pt, sep=',', index_col='last_traded')
+                df.index = time_index(df.index)
+            else:
+                df = columnar.read_frame(
+                    pt, float_dtype='float32' if self.compact else None)
+
+            if self.compact:
+                df = compact_bars(df, self.symbol)
+            elif 'symbol' not in df.columns:
+                # Сутки записаны в компактном виде - вернём колонку символа
+                df.insert(0, 'symbol', self.symbol)
+
+            self.day_cache.put(pt, df)
+
+        # Поверхностная копия защищает блок в кэше от замены колонок и индекса
+        return df.copy(deep=False)
+
+    def get_cache_stats(self):
         """
+        Метод получения счётчиков LRU-кэша суток в памяти
+        (hits, misses, evictions, blocks, bytes, max_bytes).
+        """
+        return self.day_cache.get_stats()
+
+    def convert_cache(self, cache_format: str):
+        """
+        Метод конвертирования уже за кешированных данных текущего символа и
+        частоты в другой формат. Конвертация выполняется на месте: файлы
+        старого формата удаляются, после чего читатель переключается на новый формат.
+        cache_format - Новый формат кэша
+        """
+        assert cache_format in CACHE_FORMATS, cache_format
 
-        pt = path.join(
-            self.path_cash,
-            self.symbol,
-            self.data_frequency,
-            day.strftime("%Y-%m-%d")+'.csv')
+        pt = path.join(self.path_cash, self.symbol, self.data_frequency)
+        for name in sorted(listdir(pt)):
+            old_format = 'csv' if name.endswith('.csv') else 'npy'
+            if old_format == cache_format:
+                continue
 
-        return path.exists(pt)
+            try:
+                day = pd.Timestamp(name[:10], tz='UTC')
+            except ValueError:
+                continue
+
+            self.write_day(day, self.read_day(day, old_format), cache_format)
+
+            old = self.get_day_path(day, old_format)
+            if old_format == 'csv':
+                remove(old)
+            else:
+                rmtree(old)
 
-    def load_bar_day(self, day: pd.Timestamp):
+        manifest = self.get_manifest()
+        with self.manifest_lock:
+            for entry in manifest.values():
+                entry['format'] = cache_format
+        self.save_manifest()
+
+        self.set_cache_format(cache_format)
+
+    def load_bar_day(self, day: pd.Timestamp, start_time: pd.Timestamp = None):
         """
         Метод загрузки данных с сервера за сутки.
         day - Дата (тип: datetime.date() или datetime.datetime())
+        start_time - Время, с которого догружать сутки (по умолчанию начало суток)
         """
-        # TODO: Переделать надо, так как за последние сутки bitmex вылаживает не полностью
-        #assert day.date() < (pd.Timestamp.today() - dt.timedelta(days=1))
         
         columns = ['timestamp','symbol', 'open', 'high', 'low', 'close', 'volume']
         
-        loop_time = start_time = day
-        end_time = start_time + dt.timedelta(days=1)
+        if start_time is None:
+            start_time = day
+        loop_time = start_time
+        end_time = day + dt.timedelta(days=1)
         start = 0
+        pages = []
 
         while loop_time < end_time:
+            self.limiter.acquire()
             try:
                 [data, header] = self.client.Trade.Trade_getBucketed(
                     symbol=self.symbol,
@@ -125,8 +726,8 @@ class DataReaderBitmex:
 
                 retry_after = int(e.response.headers._store['retry-after'][1])
 
-                # Произведем задержку на retry_after секунд.
-                time.sleep(retry_after)
+                # Произведем задержку на retry_after секунд для всех потоков.
+                self.limiter.pause(retry_after)
 
             except bravado.exception.HTTPServiceUnavailable as e:
                 """
@@ -171,14 +772,14 @@ class DataReaderBitmex:
                 print(e.message)
 
             else:
-                assert len(data) != 0
+                # Сервер больше ничего не отдаёт - сутки ещё не закончились
+                if len(data) == 0:
+                    break
 
-                if not start:
-                    df = pd.DataFrame(data=data, columns=columns)
-                else:
-                    df = df.append(pd.DataFrame(data=data, columns=columns), ignore_index=True)
+                # Страницы копим в списке и склеиваем один раз в конце
+                pages.append(pd.DataFrame(data=data, columns=columns))
 
-                loop_time = df.timestamp[-1]
+                loop_time = pages[-1].timestamp.iloc[-1]
 
                 start += len(data)
 
@@ -193,92 +794,142 @@ class DataReaderBitmex:
                 print('DEBUG: Ограничение пакетов:', x_ratelimit_limit,
                       'Обратный счетчик пакетов:', x_ratelimit_remainind)
                 # +++++++++++++++++++++++++++
-                # Делаем задержку дабы лимитирующий счетчик не тикал на уменьшение.
-                # Можно и 1,5 секунды, но сделаем на верняка - 2 сек.
-                time.sleep(2)
+                # Вместо фиксированной задержки подстраиваем общее ведро токенов
+                # под фактический остаток лимита.
+                self.limiter.update(x_ratelimit_limit,
+                                    x_ratelimit_remainind, x_ratelimit_reset)
+
+        if not pages:
+            pages.append(pd.DataFrame(columns=columns))
 
+        df = pd.concat(pages, ignore_index=True)
         df.set_index('timestamp', inplace=True)
         df.index.name = 'last_traded'
 
-        return df.loc[df.index < str(end_time)]
+        df.index = time_index(df.index)
+
+        return slice_bars(df, end_time=end_time)
+
+    def derive_day(self, day: pd.Timestamp):
+        """
+        Метод построения данных за сутки из минутного кэша.
+        Первый бар суток содержит минуты предыдущих суток, поэтому
+        используется и их кэш.
+        day - Дата
+        """
+        minutes = bin_minutes(self.data_frequency)
+        assert minutes <= 24*60, self.data_frequency
+
+        start_time = day.normalize()
+        end_time = start_time + dt.timedelta(days=1)
+
+        base = self.get_base_reader()
+        base.load_to_cache(start_time - dt.timedelta(days=1), end_time)
+
+        df = pd.concat([base.read_day(start_time - dt.timedelta(days=1)),
+                        base.read_day(start_time)])
+        df = df.iloc[df.index.searchsorted(
+            start_time - dt.timedelta(minutes=minutes), side='right'):]
+
+        bars = resample_bars(df, self.data_frequency)
+
+        return slice_bars(bars, start_time, end_time)
+
+    def load_day_to_cache(self, day: pd.Timestamp):
+        """
+        Метод загрузки данных за сутки с сервера в кэш.
+        Если сутки уже закэшированы не полностью, с сервера догружается
+        только недостающий хвост. Производные частоты строятся из минутного кэша.
+        day - Дата
+        """
+        entry = self.get_manifest().get(day.strftime("%Y-%m-%d"))
+
+        # Сутки закончились (с запасом в один бар) - после загрузки они полные
+        final = day + dt.timedelta(days=1, minutes=bin_minutes(self.data_frequency)) < \
+            pd.Timestamp.now(tz='UTC')
+
+        if self.is_derived():
+            df = self.derive_day(day)
+        elif entry is None or entry['last'] is None or not path.exists(self.get_day_path(day)):
+            df = self.load_bar_day(day)
+        else:
+            start_time = pd.Timestamp(entry['last']) + \
+                dt.timedelta(minutes=bin_minutes(self.data_frequency))
+            tail = self.load_bar_day(day, start_time)
+
+            df = self.read_day(day)
+            if len(tail):
+                df = pd.concat([df, tail])
+                df = df.loc[~df.index.duplicated(keep='last')]
+
+        self.write_day(day, df)
+        self.update_manifest(day, df, final)
 
     def load_to_cache(self, start_time: pd.Timestamp, end_time: pd.Timestamp):
         """
         Метод загрузки данных в диапазоне (end_time - start_time) дней
-        с сервера на файл формата CSV.
+        с сервера в кэш. Недостающие сутки загружаются параллельно в
+        self.workers потоках, которые делят одно ведро токенов.
         start_time - Начальное время (тип: pd.Timestamp())
         end_time   - Конечное время (тип: pd.Timestamp())
         """
-        # TODO: Переделать надо, так как за последние сутки bitmex вылаживает не полностью
-        #assert end_time < (pd.Timestamp.today() - dt.timedelta(days=1))
 
         assert start_time < end_time
 
-        if start_time.date() == end_time.date():
-            if not self.check_cache(start_time):
-                self.load_bar_day(start_time).to_csv(
-                    path.join(
-                        self.path_cash,
-                        self.symbol,
-                        self.data_frequency,
-                        start_time.strftime("%Y-%m-%d") + '.csv'
-                    )
-                )
-        else:
-            for day in pd.date_range(start_time, end_time, freq='D', closed='left'):
-                if not self.check_cache(day):
-                    self.load_bar_day(day).to_csv(
-                        path.join(
-                            self.path_cash,
-                            self.symbol,
-                            self.data_frequency,
-                            day.strftime("%Y-%m-%d") + '.csv'
-                        )
-                    )
+        # Сутки всегда загружаются целиком, с полуночи
+        days = day_range(start_time.normalize(), end_time)
 
-    def load_from_cache(self, start_time: pd.Timestamp, end_time: pd.Timestamp):
+        days = [day for day in days if not self.check_cache(day)]
+        if not days:
+            return
+
+        if self.is_derived():
+            # Сначала параллельно загрузим весь нужный минутный кэш,
+            # затем построим производные сутки локально.
+            self.get_base_reader().load_to_cache(
+                days[0] - dt.timedelta(days=1), days[-1] + dt.timedelta(days=1))
+            for day in days:
+                self.load_day_to_cache(day)
+            return
+
+        if len(days) <= 1 or self.workers <= 1:
+            for day in days:
+                self.load_day_to_cache(day)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # list() пробрасывает исключения из потоков
+            list(executor.map(self.load_day_to_cache, days))
+
+    def iter_days(self, start_time: pd.Timestamp, end_time: pd.Timestamp):
         """
-        Метод загрузки данных в диапазоне (end_time - start_time) дней
-        с сервера на файл формата CSV.
+        Генератор данных в диапазоне (end_time - start_time) дней из кэша
+        по одним суткам. Подходит для потоковой обработки, когда весь период
+        не нужно держать в памяти. Сутки выдаются целиком.
         start_time - Начальная дата (тип: pd.Timestamp())
         end_time   - Конечная дата (тип: pd.Timestamp())
         """
-        # TODO: Переделать надо, так как за последние сутки bitmex вылаживает не полностью
-        #assert end_time.date() < (pd.Timestamp.today() - dt.timedelta(days=1))
         assert start_time < end_time
 
         self.load_to_cache(start_time, end_time)
 
         loop_time = start_time
 
-        df = pd.read_csv(
-            path.join(
-                self.path_cash,
-                self.symbol,
-                self.data_frequency,
-                loop_time.strftime("%Y-%m-%d") + '.csv'
-            ),
-            sep=','
-        )
-
-        loop_time += dt.timedelta(days=1)
-
         while loop_time < end_time:
-            df = df.append(
-                pd.read_csv(
-                    path.join(
-                        self.path_cash,
-                        self.symbol,
-                        self.data_frequency,
-                        loop_time.strftime("%Y-%m-%d") + '.csv'
-                    ),
-                    sep=','
-                ),
-                ignore_index=True
-            )
+            yield self.read_day(loop_time)
             loop_time += dt.timedelta(days=1)
-        df.set_index('last_traded', inplace=True)
-        return df
+
+    def load_from_cache(self, start_time: pd.Timestamp, end_time: pd.Timestamp):
+        """
+        Метод загрузки данных в диапазоне (end_time - start_time) дней
+        из кэша.
+        start_time - Начальная дата (тип: pd.Timestamp())
+        end_time   - Конечная дата (тип: pd.Timestamp())
+        """
+        assert start_time < end_time
+
+        # Сутки склеиваются один раз, а не по одной (df.append копирует весь накопленный фрейм)
+        return pd.concat(list(self.iter_days(start_time, end_time)))
 
     def get_bars(self, start_time: pd.Timestamp, end_time: pd.Timestamp):
         """
@@ -286,14 +937,94 @@ class DataReaderBitmex:
         start_time - Начальная дата и время (тип: pd.Timestamp())
         end_time   - Конечная дата и время (тип: pd.Timestamp())
         """
-        # TODO: Переделать надо, так как за последние сутки bitmex вылаживает не полностью
-        #assert end_time.date() < (pd.Timestamp.today() - dt.timedelta(days=1))
         assert start_time < end_time
 
         df = self.load_from_cache(start_time, end_time)
 
-        # return df.loc[str(start_time) : str(end_time), :]
-        return df.loc[df.index >= str(start_time)][df.index < str(end_time)]
+        return slice_bars(df, start_time, end_time)
+
+    def for_symbol(self, symbol: str):
+        """
+        Метод получения читателя другого символа с тем же подключением,
+        кэшем и ведром токенов (без повторного создания клиента bitmex).
+        symbol - Символ акцива в bitmex`е.
+        """
+        reader = copy.copy(self)
+        reader.set_symbol(symbol)
+        reader.set_binSize(self.data_frequency)
+        return reader
+
+    def get_panel(self,
+                  symbols: list,
+                  start_time: pd.Timestamp,
+                  end_time: pd.Timestamp,
+                  fields: list = PANEL_FIELDS,
+                  fill: str = None):
+        """
+        Метод получения данных нескольких символов за период, выровненных
+        по общей сетке времени текущей частоты. Символы загружаются параллельно.
+
+        Результат - DataFrame с колонками (поле, символ). Бары, которых у
+        символа нет на сетке, обрабатываются по параметру fill:
+            None    - остаются NaN;
+            'ffill' - цены заполняются последним close, объём - нулём.
+
+        symbols    - Список символов
+        start_time - Начальная дата и время (тип: pd.Timestamp())
+        end_time   - Конечная дата и время (тип: pd.Timestamp())
+        fields     - Колонки баров
+        fill       - Способ заполнения пропусков
+        """
+        assert start_time < end_time
+        assert fill in (None, 'ffill'), fill
+
+        step = pd.Timedelta(minutes=bin_minutes(self.data_frequency))
+        first = pd.Timestamp(-(-start_time.value // step.value) * step.value, tz='UTC')
+        grid = pd.date_range(first, end_time, freq=step, name='last_traded')
+        grid = time_index(grid[grid < end_time])
+
+        readers = [self.for_symbol(symbol) for symbol in symbols]
+        with ThreadPoolExecutor(max_workers=max(1, len(readers))) as executor:
+            frames = list(executor.map(
+                lambda reader: reader.get_bars(start_time, end_time), readers))
+
+        # Колонки (поле, символ) заполняются на месте, без join'ов фреймов
+        n = len(symbols)
+        values = np.full((len(grid), len(fields) * n), np.nan)
+        for k, df in enumerate(frames):
+            pos = grid.get_indexer(df.index)
+            ok = pos >= 0
+            for f, field in enumerate(fields):
+                values[pos[ok], f * n + k] = df[field].values[ok]
+
+        if fill == 'ffill' and 'close' in fields:
+            close = values[:, list(fields).index('close') * n:][:, :n]
+            valid = ~np.isnan(close)
+            # Индекс последнего известного бара для каждой строки
+            last = np.where(valid, np.arange(len(grid))[:, None], 0)
+            last = np.maximum.accumulate(last, axis=0)
+            filled = np.take_along_axis(close, last, axis=0)
+
+            for f, field in enumerate(fields):
+                block = values[:, f * n:(f + 1) * n]
+                if field == 'volume':
+                    block[~valid] = 0.0
+                else:
+                    block[~valid] = filled[~valid]
+
+        columns = pd.MultiIndex.from_product([list(fields), list(symbols)])
+        return pd.DataFrame(values, index=grid, columns=columns)
+
+
+def panel_to_array(panel: pd.DataFrame):
+    """
+    Метод перевода панели из get_panel() в трёхмерный массив
+    формы (число баров, число полей, число символов).
+    panel - Панель (тип: pd.DataFrame())
+    """
+    fields = panel.columns.get_level_values(0).unique()
+    symbols = panel.columns.get_level_values(1).unique()
+    return panel.to_numpy().reshape(len(panel), len(fields), len(symbols))
 
 
 if __name__ == "__main__":
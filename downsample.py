@@ -0,0 +1,117 @@
+"""
+Прореживание данных для графиков analyze().
+
+Plotly держит в браузере каждую точку каждого графика, поэтому на длинном
+периоде HTML-файл и память растут вместе с числом баров. Здесь число точек
+ограничивается заранее заданным бюджетом:
+
+    ohlc_buckets - свечи объединяются в корзины по подряд идущим барам
+                   (open первого, high - наибольший, low - наименьший,
+                   close последнего бара корзины);
+    lttb         - линии (скользящие средние, капитал) прореживаются
+                   алгоритмом Largest-Triangle-Three-Buckets, который
+                   сохраняет форму кривой, в том числе экстремумы.
+
+Точки сделок не прореживаются: их индексы передаются в keep и всегда
+остаются на линии, а сами маркеры строятся по полным данным.
+"""
+import numpy as np
+import pandas as pd
+
+# Бюджет точек на один график по умолчанию
+DEFAULT_POINTS = 2000
+
+
+def _edges(n: int, buckets: int):
+    # Границы корзин из подряд идущих баров почти равного размера
+    return np.unique(np.linspace(0, n, buckets + 1).astype('int64'))
+
+
+def ohlc_buckets(bars: pd.DataFrame, buckets: int = DEFAULT_POINTS):
+    """
+    Метод объединения свечей в не более чем buckets корзин. Время корзины -
+    время её первого бара. Если баров не больше buckets, возвращает бары.
+    bars    - Бары с колонками open, high, low, close (тип: pd.DataFrame())
+    buckets - Число корзин
+    """
+    n = len(bars)
+    if buckets is None or n <= buckets:
+        return bars[['open', 'high', 'low', 'close']]
+
+    edges = _edges(n, buckets)
+    starts, ends = edges[:-1], edges[1:]
+
+    return pd.DataFrame({
+        'open': bars['open'].to_numpy(dtype='float64')[starts],
+        'high': np.fmax.reduceat(bars['high'].to_numpy(dtype='float64'), starts),
+        'low': np.fmin.reduceat(bars['low'].to_numpy(dtype='float64'), starts),
+        'close': bars['close'].to_numpy(dtype='float64')[ends - 1],
+    }, index=bars.index[starts])
+
+
+def lttb(x, y, points: int = DEFAULT_POINTS):
+    """
+    Метод выбора points точек кривой алгоритмом Largest-Triangle-Three-Buckets.
+    Первая и последняя точки сохраняются всегда. Возвращает индексы точек.
+    x      - Координаты по оси x, возрастающие (тип: np.ndarray)
+    y      - Значения (тип: np.ndarray)
+    points - Число точек
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    n = len(x)
+    if n <= points or points < 3:
+        return np.arange(n)
+
+    # Внутренние точки делятся на points - 2 корзины
+    edges = 1 + _edges(n - 2, points - 2)
+    selected = np.empty(len(edges) + 1, dtype='int64')
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for k in range(len(edges) - 1):
+        lo, hi = edges[k], edges[k + 1]
+
+        # Третья вершина - среднее следующей корзины (для последней - последняя точка)
+        if k + 2 < len(edges):
+            next_lo, next_hi = edges[k + 1], edges[k + 2]
+            avg_x = x[next_lo:next_hi].mean()
+            avg_y = y[next_lo:next_hi].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        # Удвоенная площадь треугольника (a, точка корзины, среднее следующей)
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) -
+                      (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[k + 1] = a
+
+    return selected
+
+
+def downsample_line(series: pd.Series, points: int = DEFAULT_POINTS, keep=None):
+    """
+    Метод прореживания линии графика до points точек (LTTB) плюс точки keep.
+    Пропуски (NaN) не рисуются и в прореживании не участвуют.
+    series - Линия с индексом по времени (тип: pd.Series())
+    points - Число точек (None - без прореживания)
+    keep   - Метки индекса, которые должны остаться (например бары сделок)
+    """
+    if points is None or len(series) <= points:
+        return series
+
+    values = series.to_numpy(dtype='float64')
+    finite = np.flatnonzero(np.isfinite(values))
+
+    x = series.index[finite]
+    if isinstance(series.index, pd.DatetimeIndex):
+        x = x.values.astype('datetime64[ns]').view('int64')
+    x = np.asarray(x, dtype='float64')
+
+    index = finite[lttb(x - x[0] if len(x) else x, values[finite], points)]
+    if keep is not None and len(keep):
+        index = np.union1d(index, series.index.get_indexer(keep))
+        index = index[index >= 0]
+
+    return series.iloc[index]
@@ -13,14 +13,16 @@ from zipline.utils.calendars import (
 from zipline.utils.cli import maybe_show_progress
 from zipline.data.bundles import register
 
+# Адрес REST API по умолчанию; другой (например bitmexstub.py) можно
+# задать здесь или передать в bitmex(symbols, url=...)
 BITMEX_REST_URL = 'https://testnet.bitmex.com/api/v1'
 
 
-def _bitmex_rest(operation: str, params: dict = None) -> list:
+def _bitmex_rest(operation: str, params: dict = None, url: str = None) -> list:
     assert operation[0] == '/'
     if params is None:
         params = {}
-    res = get(BITMEX_REST_URL+operation, params=params)
+    res = get((url or BITMEX_REST_URL)+operation, params=params)
     assert res.ok
     res = res.json()
     assert type(res) is list
@@ -57,7 +59,7 @@ def _bitmex_rest(operation: str, params: dict = None) -> list:
 #     return metadata
 
 
-def _get_minute_bar(symbol: str, day_start: pd.Timestamp):
+def _get_minute_bar(symbol: str, day_start: pd.Timestamp, url: str = None):
     day_end = day_start + timedelta(days=1, seconds=-1)
     res = []
     for _ in range(3):
@@ -69,18 +71,17 @@ def _get_minute_bar(symbol: str, day_start: pd.Timestamp):
                 'symbol': symbol,
                 'startTime': day_start.isoformat(),
                 'endTime': day_end.isoformat(),
-                'start': len(res)})
+                'start': len(res)},
+            url=url)
         assert len(_res) != 0
         res += _res
     assert len(res) == 24*60
     res = pd.DataFrame.from_dict(res)
     res.drop('symbol', axis=1, inplace=True)
-    # I think this is a bug of pandas
-    # res['timestamp'] = pd.to_datetime(res['timestamp'], utc=True)
-    for i in range(res.shape[0]):
-        res.loc[i, 'timestamp'] = pd.to_datetime(
-            res.loc[i, 'timestamp'], utc=True)
-    res.set_index('timestamp', inplace=True)
+    # Время переводится сразу всем массивом: построчная запись Timestamp
+    # в строковую колонку новые версии pandas не допускают
+    timestamp = pd.to_datetime(res.pop('timestamp').values, utc=True)
+    res.index = pd.DatetimeIndex(timestamp, name='timestamp')
     assert res.shape[1] == 11
     return res
 
@@ -89,17 +90,18 @@ def _get_minute_bars(
         sid_map: list,
         start_session: pd.Timestamp,
         end_session: pd.Timestamp,
-        cache):
+        cache,
+        url: str = None):
     for sid, symbol in sid_map:
         for day in pd.date_range(start_session, end_session, freq='D', closed='left'):
             key = symbol+'-'+day.strftime("%Y-%m-%d")
             if key not in cache:
-                cache[key] = _get_minute_bar(symbol, day)
+                cache[key] = _get_minute_bar(symbol, day, url)
             yield sid, cache[key]
 
 
-def _get_metadata(sid: int, symbol: str, metadata: pd.DataFrame):
-    res = _bitmex_rest('/instrument', {'symbol': symbol})
+def _get_metadata(sid: int, symbol: str, metadata: pd.DataFrame, url: str = None):
+    res = _bitmex_rest('/instrument', {'symbol': symbol}, url)
 
     assert len(res) == 1
 
@@ -113,7 +115,7 @@ def _get_metadata(sid: int, symbol: str, metadata: pd.DataFrame):
     metadata['exchange'] = 'bitmex'
 
 
-def _pricing_iter(metadata, symbols, show_progress, start_session, end_session, cache):
+def _pricing_iter(metadata, symbols, show_progress, start_session, end_session, cache, url=None):
     sid = 0
     with maybe_show_progress(
             symbols,
@@ -121,16 +123,16 @@ def _pricing_iter(metadata, symbols, show_progress, start_session, end_session,
             label='BitMex pricing data: ') as it:
 
         for symbol in it:
-            _get_metadata(sid, symbol, metadata)
+            _get_metadata(sid, symbol, metadata, url)
             for day in pd.date_range(start_session, end_session, freq='D', closed='left'):
                 key = symbol+'-'+day.strftime("%Y-%m-%d")
                 if key not in cache:
-                    cache[key] = _get_minute_bar(symbol, day)
+                    cache[key] = _get_minute_bar(symbol, day, url)
                 yield sid, cache[key]
             sid += 1
 
 
-def bitmex(symbols: list):
+def bitmex(symbols: list, url: str = None):
     def ingest(
             environ,
             asset_db_writer,
@@ -157,7 +159,7 @@ def bitmex(symbols: list):
 
         minute_bar_writer.write(
             _pricing_iter(metadata, symbols, show_progress,
-                          start_session, end_session, cache),
+                          start_session, end_session, cache, url),
             show_progress=show_progress)
 
         asset_db_writer.write(futures=metadata)
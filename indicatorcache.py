@@ -0,0 +1,156 @@
+"""
+Общий кэш индикаторов.
+
+Результат индикатора (например SMA(40) по close) хранится по ключу из
+отпечатка данных (хэш значений и индекса) и описания индикатора, поэтому
+стратегии и повторные прогоны на тех же барах и окнах не считают его заново.
+В памяти держатся последние использованные результаты в пределах бюджета
+байт (LRU), на диске - файлы .npy в каталоге <path_cash>/indicators.
+"""
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from os import path, makedirs, replace
+
+# Каталог индикаторов внутри кэша данных
+INDICATORS_DIR = 'indicators'
+
+
+def fingerprint(data):
+    """
+    Метод получения отпечатка данных: хэш значений и индекса.
+    data - Данные (тип: pd.Series(), pd.DataFrame() или np.ndarray)
+    """
+    h = hashlib.blake2b(digest_size=16)
+
+    if isinstance(data, (pd.Series, pd.DataFrame)):
+        if isinstance(data.index, pd.DatetimeIndex):
+            index = data.index.values.astype('datetime64[ns]')
+        else:
+            index = pd.util.hash_pandas_object(data.index, index=False).values
+        h.update(np.ascontiguousarray(index).tobytes())
+        data = data.to_numpy()
+
+    values = np.ascontiguousarray(data)
+    h.update(str(values.dtype).encode())
+    h.update(str(values.shape).encode())
+    h.update(values.tobytes())
+
+    return h.hexdigest()
+
+
+class IndicatorCache:
+    """
+    Потокобезопасный кэш результатов индикаторов.
+
+    Когда суммарный размер результатов превышает max_bytes, вытесняются
+    результаты, к которым дольше всего не обращались. Если задан path_cash,
+    результаты дополнительно пишутся на диск и читаются оттуда при промахе
+    в памяти.
+
+    Требования:
+        max_bytes - Бюджет памяти в байтах (0 - не держать в памяти).
+        path_cash - Путь к кэшу данных (по умолчанию без записи на диск).
+    """
+
+    def __init__(self, max_bytes: int = 128 * 2**20, path_cash: str = None):
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.path = None if path_cash is None else path.join(path.abspath(path_cash), INDICATORS_DIR)
+        self.items = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _file(self, key):
+        return path.join(self.path, key[0], '-'.join(str(part) for part in key[1]) + '.npy')
+
+    def _put(self, key, values: np.ndarray):
+        if values.nbytes > self.max_bytes:
+            return
+
+        if key in self.items:
+            self.bytes -= self.items.pop(key).nbytes
+        self.items[key] = values
+        self.bytes += values.nbytes
+
+        while self.bytes > self.max_bytes:
+            _, old = self.items.popitem(last=False)
+            self.bytes -= old.nbytes
+            self.evictions += 1
+
+    def get(self, data, spec: tuple, compute):
+        """
+        Метод получения результата индикатора: из памяти, с диска или
+        расчётом compute(). Результат только для чтения.
+        data    - Входные данные индикатора (по ним считается отпечаток)
+                  или уже посчитанный отпечаток fingerprint(data)
+        spec    - Описание индикатора, например ('sma', 'close', 40)
+        compute - Функция без аргументов, считающая индикатор
+        """
+        key = (data if isinstance(data, str) else fingerprint(data), tuple(spec))
+
+        with self.lock:
+            if key in self.items:
+                self.hits += 1
+                self.items.move_to_end(key)
+                return self.items[key]
+
+        values = None
+        if self.path is not None and path.exists(self._file(key)):
+            values = np.load(self._file(key))
+            with self.lock:
+                self.disk_hits += 1
+
+        if values is None:
+            values = np.asarray(compute())
+            with self.lock:
+                self.misses += 1
+
+            if self.path is not None:
+                pt = self._file(key)
+                makedirs(path.dirname(pt), exist_ok=True)
+                with open(pt + '.tmp', 'wb') as f:
+                    np.save(f, values)
+                replace(pt + '.tmp', pt)
+
+        values.setflags(write=False)
+        with self.lock:
+            self._put(key, values)
+
+        return values
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.bytes = 0
+
+    def get_stats(self):
+        """
+        Метод получения счётчиков кэша.
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'items': len(self.items),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Кэш в памяти, общий для всех стратегий процесса
+_shared_cache = IndicatorCache()
+
+
+def get_indicator_cache():
+    """
+    Метод получения общего для процесса кэша индикаторов.
+    """
+    return _shared_cache
@@ -0,0 +1,193 @@
+"""
+Векторные ядра скользящих средних.
+
+    sma - простая средняя из префиксных сумм;
+    wma - взвешенная средняя (веса 1, 2, ..., window) из двух префиксных сумм;
+    ema - экспоненциальная средняя y = a*x + (1 - a)*y_prev, a = 2 / (window + 1),
+          в замкнутой форме по блокам.
+
+Все ядра считают сразу несколько окон и возвращают массив формы
+(число баров, число окон). Как rolling(window, min_periods=1): пока баров
+меньше окна, sma и wma берут все имеющиеся бары; ema начинается с первого
+значения (ewm(span=window, adjust=False)).
+
+Устойчивость на миллионах баров: цены, кратные шагу цены (как у BitMex),
+суммируются точно в целых int64; остальные суммируются кусками по CHUNK_SIZE
+баров, центрированными на среднее куска, поэтому ошибка не растёт с длиной ряда.
+"""
+import numpy as np
+
+from columnar import tick_size, tick_scale
+
+# Типы скользящих средних
+MA_TYPES = ('sma', 'ema', 'wma')
+
+# Число баров в куске при суммировании
+CHUNK_SIZE = 2**12
+
+
+def _prepare(values: np.ndarray, bound: int):
+    """
+    Приводит значения к виду для точного суммирования: цены, кратные шагу,
+    - к целым числам шагов. Возвращает (значения, число шагов в единице
+    цены); None - точное суммирование невозможно, значения остаются как есть.
+    Средние из целых сумм делятся на число шагов в единице (не умножаются
+    на шаг): так при шаге 0.05 получается та же цена, что в исходных данных.
+    bound - Наибольший множитель суммы (целые суммы не должны переполниться)
+    """
+    tick = tick_size(values) if len(values) else None
+    if tick is not None:
+        scale = tick_scale(tick)
+        ticks = np.round(values * scale).astype('int64')
+        if np.abs(ticks).max(initial=0) * bound < 2**62:
+            return ticks, scale
+
+    return values, None
+
+
+def _center(local: np.ndarray, scale: int, valid: np.ndarray = None):
+    # Кусок без точного суммирования сдвигается на своё среднее
+    if scale is not None:
+        return local, scale, 0.0
+
+    finite = local if valid is None else local[valid]
+    center = float(finite.mean()) if len(finite) else 0.0
+    return local - center, 1.0, center
+
+
+def _chunks(n: int, window: int):
+    # Куски выхода [start, end) и начало входа lo, достаточное для всех окон куска
+    for start in range(0, n, CHUNK_SIZE):
+        yield max(start - window + 1, 0), start, min(start + CHUNK_SIZE, n)
+
+
+def _windows(windows):
+    windows = np.atleast_1d(np.asarray(windows, dtype='int64'))
+    assert (windows > 0).all(), windows
+    return windows
+
+
+def sma(values, windows):
+    """
+    Метод расчёта простых скользящих средних для нескольких окон.
+    Пропуски (NaN) не учитываются, как в pandas rolling().mean().
+    values  - Значения (тип: np.ndarray или pd.Series)
+    windows - Окна
+    """
+    values = np.asarray(values, dtype='float64')
+    windows = _windows(windows)
+    n = len(values)
+
+    x, scale = _prepare(values, n)
+    valid = np.isfinite(values)
+
+    out = np.empty((n, len(windows)))
+    for lo, start, end in _chunks(n, windows.max(initial=1)):
+        local, divisor, center = _center(x[lo:end], scale, valid[lo:end])
+        local = np.where(valid[lo:end], local, 0)
+
+        zero = np.zeros(1, dtype=local.dtype)
+        prefix = np.concatenate((zero, np.cumsum(local)))
+        counts = np.concatenate(([0], np.cumsum(valid[lo:end])))
+
+        ends = np.arange(start, end)[:, None] + 1 - lo
+        starts = np.maximum(ends - windows[None, :], 0)
+
+        count = counts[ends] - counts[starts]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (prefix[ends] - prefix[starts]) / count / divisor
+        out[start:end] = np.where(count > 0, mean + center, np.nan)
+
+    return out
+
+
+def wma(values, windows):
+    """
+    Метод расчёта линейно-взвешенных скользящих средних для нескольких окон:
+    последний бар окна имеет вес window, первый - 1. Значения без пропусков.
+    values  - Значения (тип: np.ndarray или pd.Series)
+    windows - Окна
+    """
+    values = np.asarray(values, dtype='float64')
+    windows = _windows(windows)
+    n = len(values)
+    assert np.isfinite(values).all(), 'wma: пропуски в значениях'
+
+    size = min(n, CHUNK_SIZE + windows.max(initial=1))
+    x, scale = _prepare(values, size * size)
+
+    out = np.empty((n, len(windows)))
+    for lo, start, end in _chunks(n, windows.max(initial=1)):
+        local, divisor, center = _center(x[lo:end], scale)
+
+        zero = np.zeros(1, dtype=local.dtype)
+        # Суммы значений и значений, умноженных на номер бара в куске
+        prefix = np.concatenate((zero, np.cumsum(local)))
+        weighted = np.concatenate((zero, np.cumsum(local * np.arange(1, len(local) + 1))))
+
+        ends = np.arange(start, end)[:, None] + 1 - lo
+        starts = np.maximum(ends - windows[None, :], 0)
+
+        # Вес бара i в окне (starts, ends] равен i - starts
+        numerator = (weighted[ends] - weighted[starts]) - starts * (prefix[ends] - prefix[starts])
+        count = ends - starts
+        out[start:end] = numerator / (count * (count + 1) / 2) / divisor + center
+
+    return out
+
+
+def ema(values, windows):
+    """
+    Метод расчёта экспоненциальных скользящих средних для нескольких окон,
+    как ewm(span=window, adjust=False).mean(). Значения без пропусков.
+    Рекурсия считается в замкнутой форме по блокам, в пределах которых
+    степени (1 - a) не выходят за диапазон float64.
+    values  - Значения (тип: np.ndarray или pd.Series)
+    windows - Окна
+    """
+    values = np.asarray(values, dtype='float64')
+    windows = _windows(windows)
+    n = len(values)
+    assert np.isfinite(values).all(), 'ema: пропуски в значениях'
+
+    out = np.empty((n, len(windows)))
+    if n == 0:
+        return out
+
+    center = values[0]
+    x = values - center
+
+    for k, window in enumerate(windows):
+        alpha = 2.0 / (window + 1.0)
+        decay = 1.0 - alpha
+        if decay == 0.0:
+            out[:, k] = values
+            continue
+
+        # Длина блока: decay ** -block не больше 1e250
+        block = max(1, min(n, int(250 * np.log(10) / -np.log(decay))))
+        powers = decay ** np.arange(block + 1)
+
+        carry = 0.0
+        for start in range(0, n, block):
+            end = min(start + block, n)
+            m = end - start
+            # y[start + j] = decay**(j+1) * carry + decay**j * sum_i a * x[start + i] * decay**-i
+            terms = np.cumsum(alpha * x[start:end] / powers[:m])
+            y = powers[1:m + 1] * carry + powers[:m] * terms
+            out[start:end, k] = y
+            carry = y[-1]
+
+    return out + center
+
+
+def moving_average(values, windows, ma_type: str = 'sma'):
+    """
+    Метод расчёта скользящих средних выбранного типа.
+    values  - Значения (тип: np.ndarray или pd.Series)
+    windows - Окна
+    ma_type - Тип средней из MA_TYPES
+    """
+    assert ma_type in MA_TYPES, ma_type
+
+    return {'sma': sma, 'ema': ema, 'wma': wma}[ma_type](values, windows)
@@ -0,0 +1,207 @@
+"""
+Метрики качества результатов бэк-теста.
+
+Все функции векторные и принимают как одну кривую (вектор по барам), так и
+пачку кривых - матрицу (число баров, число прогонов), например кривые
+перебора окон из sweep_ma_crossover.crossover_curves(). Результат - по
+значению на каждый прогон, без цикла python по прогонам.
+
+Входные колонки - как в MarketOnClosePortfolio.get_portfolio():
+    total     - Капитал
+    positions - Сделки (изменение позиции в единицах актива)
+    fees      - Комиссии бара (comission_maker + comission_taker)
+"""
+import numpy as np
+import pandas as pd
+
+# Метрики, которые считает evaluate()
+METRICS = ('total', 'sharpe', 'sortino', 'max_drawdown', 'drawdown_duration',
+           'trades', 'turnover', 'fee_drag', 'hit_rate', 'avg_trade_pnl')
+
+
+def _matrix(values):
+    values = np.asarray(values, dtype='float64')
+    return values[:, None] if values.ndim == 1 else values
+
+
+def periods_per_year(index: pd.DatetimeIndex):
+    """
+    Метод получения числа баров в году по шагу индекса (крипто-рынок
+    торгуется круглосуточно, 365 дней в году).
+    index - Индекс по времени баров
+    """
+    step = np.median(np.diff(pd.DatetimeIndex(index).values.astype('datetime64[ns]').view('int64')))
+    return 365 * 24 * 3600 * 10**9 / step
+
+
+def returns(total):
+    """
+    Метод расчёта доходностей бар к бару, форма (число баров - 1, число прогонов).
+    total - Капитал
+    """
+    total = _matrix(total)
+    return total[1:] / total[:-1] - 1.0
+
+
+def sharpe_ratio(total, periods_per_year: float):
+    """
+    Метод расчёта годового коэффициента Шарпа (безрисковая ставка - 0).
+    total - Капитал
+    periods_per_year - Число баров в году
+    """
+    r = returns(total)
+    std = np.nanstd(r, axis=0, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nanmean(r, axis=0) / std * np.sqrt(periods_per_year)
+
+
+def sortino_ratio(total, periods_per_year: float):
+    """
+    Метод расчёта годового коэффициента Сортино (риск - только падения).
+    total - Капитал
+    periods_per_year - Число баров в году
+    """
+    r = returns(total)
+    downside = np.sqrt(np.nanmean(np.minimum(r, 0.0) ** 2, axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nanmean(r, axis=0) / downside * np.sqrt(periods_per_year)
+
+
+def max_drawdown(total):
+    """
+    Метод расчёта наибольшей просадки (доля от предыдущего максимума) и
+    наибольшей длительности просадки в барах. Возвращает пару массивов.
+    total - Капитал
+    """
+    total = _matrix(total)
+    peaks = np.fmax.accumulate(total, axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        depth = np.nanmax(1.0 - total / peaks, axis=0, initial=0.0)
+
+    # Длительность - число баров с последнего максимума
+    rows = np.arange(len(total))[:, None]
+    last_peak = np.maximum.accumulate(np.where(total >= peaks, rows, 0), axis=0)
+    duration = (rows - last_peak).max(axis=0, initial=0)
+
+    return depth, duration
+
+
+def turnover(positions, close, total):
+    """
+    Метод расчёта оборота: объём сделок в деньгах к среднему капиталу.
+    positions - Сделки
+    close     - Цены закрытия (вектор по барам или матрица)
+    total     - Капитал
+    """
+    traded = np.nansum(np.abs(_matrix(positions)) * _matrix(close), axis=0)
+    return traded / np.nanmean(_matrix(total), axis=0)
+
+
+def fee_drag(fees, capital):
+    """
+    Метод расчёта потерь на комиссиях как доли начального капитала.
+    fees    - Комиссии бара
+    capital - Начальный капитал (число или вектор по прогонам)
+    """
+    return np.nansum(_matrix(fees), axis=0) / capital
+
+
+def trade_pnl(positions, close, fees=None):
+    """
+    Метод расчёта дохода каждой сделки от открытия до закрытия позиции
+    (незакрытая на последнем баре позиция оценивается по последней цене).
+    Возвращает матрицу (наибольшее число сделок, число прогонов), в которой
+    у прогонов с меньшим числом сделок лишние строки - NaN.
+    positions - Сделки
+    close     - Цены закрытия (вектор по барам или матрица)
+    fees      - Комиссии бара
+    """
+    positions = np.nan_to_num(_matrix(positions))
+    close = np.broadcast_to(_matrix(close), positions.shape)
+    n, m = positions.shape
+
+    units = np.cumsum(positions, axis=0)
+    before = np.vstack([np.zeros((1, m)), units[:-1]])
+    # Номер сделки: растёт на каждом открытии позиции
+    trade = np.cumsum((before == 0) & (units != 0), axis=0)
+    count = trade[-1] if n else np.zeros(m, dtype='int64')
+
+    flows = -positions * close
+    if fees is not None:
+        flows = flows - np.nan_to_num(_matrix(fees))
+    if n:
+        flows[-1] += units[-1] * close[-1]
+
+    # Все прогоны - одним bincount: у каждого свой диапазон номеров сделок
+    size = int(count.max(initial=0)) + 1
+    ids = trade + np.arange(m) * size
+    pnl = np.bincount(ids.ravel(), weights=flows.ravel(), minlength=m * size)
+    pnl = pnl.reshape(m, size).T[1:]
+
+    pnl[np.arange(1, size)[:, None] > count[None, :]] = np.nan
+    return pnl
+
+
+def evaluate(total,
+             positions=None,
+             close=None,
+             fees=None,
+             capital=None,
+             periods_per_year: float = 365 * 24 * 12):
+    """
+    Метод расчёта всех метрик METRICS для одного или пачки прогонов.
+    Метрики сделок требуют positions и close, fee_drag - fees.
+    Возвращает DataFrame: строка на прогон, колонки - метрики.
+    total     - Капитал
+    positions - Сделки
+    close     - Цены закрытия (вектор по барам или матрица)
+    fees      - Комиссии бара
+    capital   - Начальный капитал (по умолчанию первое известное значение total)
+    periods_per_year - Число баров в году (по умолчанию для баров '5m')
+    """
+    total = _matrix(total)
+
+    if capital is None:
+        # Первая строка total в MarketOnClosePortfolio - NaN
+        first = np.argmax(~np.isnan(total), axis=0)
+        capital = total[first, np.arange(total.shape[1])]
+
+    depth, duration = max_drawdown(total)
+    result = {
+        'total': total[-1] if len(total) else np.full(total.shape[1], np.nan),
+        'sharpe': sharpe_ratio(total, periods_per_year),
+        'sortino': sortino_ratio(total, periods_per_year),
+        'max_drawdown': depth,
+        'drawdown_duration': duration,
+    }
+
+    if positions is not None and close is not None:
+        pnl = trade_pnl(positions, close, fees)
+        with np.errstate(invalid='ignore'):
+            result['trades'] = np.count_nonzero(~np.isnan(pnl), axis=0)
+            result['turnover'] = turnover(positions, close, total)
+            result['hit_rate'] = np.nansum(pnl > 0, axis=0) / result['trades']
+            result['avg_trade_pnl'] = np.nansum(pnl, axis=0) / result['trades']
+
+    if fees is not None:
+        result['fee_drag'] = fee_drag(fees, capital)
+
+    return pd.DataFrame(result, columns=[metric for metric in METRICS if metric in result])
+
+
+def evaluate_portfolio(portfolio: pd.DataFrame, close, capital: float = None):
+    """
+    Метод расчёта метрик по результату MarketOnClosePortfolio.get_portfolio().
+    Возвращает pd.Series метрик.
+    portfolio - Портфолио (тип: pd.DataFrame())
+    close     - Цены закрытия баров
+    capital   - Начальный капитал
+    """
+    metrics = evaluate(portfolio['total'],
+                       positions=portfolio['positions'],
+                       close=close,
+                       fees=portfolio['comission_maker'] + portfolio['comission_taker'],
+                       capital=capital,
+                       periods_per_year=periods_per_year(portfolio.index))
+    return metrics.iloc[0]
@@ -4,13 +4,24 @@
 """
 
 import datetime
+from os import path, listdir, replace
+from shutil import rmtree
 import numpy as np
 import pandas as pd
 
-from plotly.offline import plot
-import plotly.graph_objs as go
-
 from metabacktest import Strategy, Portfolio
+import columnar
+from indicatorcache import IndicatorCache, get_indicator_cache, fingerprint
+from indicators import MA_TYPES, moving_average
+from downsample import DEFAULT_POINTS
+import report
+
+# Итоги, которые backtest() может посчитать без колонок по каждому бару
+SUMMARY_FIELDS = ('total', 'pnl', 'fees', 'trades', 'max_drawdown', 'bars')
+
+# Колонки кривой, которую backtest(spill=...) пишет по кускам
+SPILL_COLUMNS = ('signal', 'positions', 'holdings', 'comission_maker', 'comission_taker',
+                 'cash', 'total', 'change')
 
 
 class MovingAverageCrossStrategy(Strategy):
@@ -23,28 +34,44 @@ class MovingAverageCrossStrategy(Strategy):
         bars  - Данные курса акцива
         short_window - Окно короткой средней скользящей
         long_window -  Окно длинной средней скоьзящей
+        cache - Кэш индикаторов (по умолчанию общий кэш процесса)
+        ma_type - Тип скользящих средних: 'sma', 'ema' или 'wma' (indicators.MA_TYPES)
     """
 
-    def __init__(self, symbol: str, bars: pd.DataFrame, short_window: int = 40, long_window: int = 100):
+    def __init__(self, symbol: str, bars: pd.DataFrame, short_window: int = 40, long_window: int = 100,
+                 cache: IndicatorCache = None, ma_type: str = 'sma'):
+        assert ma_type in MA_TYPES, ma_type
+
         self.symbol = symbol
         self.bars = bars
 
         self.short_window = short_window
         self.long_window = long_window
+        self.ma_type = ma_type
 
-        self.signals = pd.DataFrame(index=self.bars.index)
-        self.signals['signal'] = 0.0
+        if cache is None:
+            cache = get_indicator_cache()
 
-        # Создаём набор shor и long простых скользящих средних за соответствующие периоды
-        self.signals['short_mavg'] = pd.rolling_mean(
-            self.bars['close'], self.short_window, min_periods=1)
-        self.signals['long_mavg'] = pd.rolling_mean(
-            self.bars['close'], self.long_window,  min_periods=1)
+        self.signals = pd.DataFrame(index=self.bars.index)
 
-        # Создайте 'signal' (инвестированный или не инвестированный), когда shor (короткая) простая скользящая средняя пересекает
-        # long (длинную) простую скользящую средную.
-        self.signals['signal'][self.short_window:] = np.where(self.signals['short_mavg'][self.short_window:]
-                                                              > self.signals['long_mavg'][self.short_window:], 1.0, 0.0)
+        # Создаём набор shor и long скользящих средних за соответствующие периоды.
+        # Средние по тем же барам и окнам берутся из кэша индикаторов.
+        close = self.bars['close']
+        key = fingerprint(close)
+        short_mavg = cache.get(
+            key, (ma_type, 'close', self.short_window),
+            lambda: moving_average(close, self.short_window, ma_type)[:, 0])
+        long_mavg = cache.get(
+            key, (ma_type, 'close', self.long_window),
+            lambda: moving_average(close, self.long_window, ma_type)[:, 0])
+
+        # Создайте 'signal' (инвестированный или не инвестированный), когда shor (короткая) скользящая средняя пересекает
+        # long (длинную) скользящую средную.
+        signal = np.where(short_mavg > long_mavg, 1.0, 0.0)
+        signal[:self.short_window] = 0.0
+        self.signals['signal'] = signal
+        self.signals['short_mavg'] = short_mavg
+        self.signals['long_mavg'] = long_mavg
 
         # Принимайте разницу в сигналах, чтобы генерировать фактические торговые ордеры
         self.signals['positions'] = self.signals['signal'].diff()
@@ -81,24 +108,44 @@ class MarketOnClosePortfolio(Portfolio):
         strategy  - Объёкт Strategy описывающий логику торговой стратегии
         volume  - Объём покупаемых активов.
         capital - Объём средств на старте торговли.
+        maker - Комиссия при покупке акцива.
+        taker - Комиссия при продаже акцива.
     """
 
-    def __init__(self, strategy: Strategy = None, volume: int = 10, capital: float = 1000000.0):
+    def __init__(self, strategy: Strategy = None, volume: int = 10, capital: float = 1000000.0,
+                 maker: float = 0.00025, taker: float = 0.00075):
         self.symbol = strategy.get_symbol()
         self.bars = strategy.get_bars()
         self.signals = strategy.get_signals()
         self.capital = float(capital)
         self.volume = volume
         # Комиссия
-        self.maker = 0.00025  # При покупки акцива
-        self.taker = 0.00075  # При продаже акцива
+        self.maker = maker  # При покупки акцива
+        self.taker = taker  # При продаже акцива
 
         self.portfolio = pd.DataFrame(index=self.bars.index)
 
         self.portfolio['signal'] = self.signals['signal'] * self.volume
         self.portfolio['positions'] = self.signals['positions'] * self.volume
+        self.summary = None
+
+    def backtest(self, summary: list = None, spill: str = None, chunk_size: int = 2**16):
+        """
+        Метод бэк-теста.
+        По умолчанию строит в self.portfolio все колонки по каждому бару.
+        Если задан summary или spill, бары обрабатываются кусками по
+        chunk_size за один проход, и колонки по барам в памяти не хранятся.
+        summary    - Список итогов из SUMMARY_FIELDS (результат - get_summary())
+        spill      - Путь к каталогу, куда кусками записывается полная кривая
+                     в колоночном формате (читается columnar.read_parts()).
+                     Прежний набор частей подменяется целиком после прогона;
+                     каталог с другими файлами не перезаписывается
+        chunk_size - Число баров в куске
+        """
+        if summary is not None or spill is not None:
+            self._backtest_chunks(summary or [], spill, chunk_size)
+            return
 
-    def backtest(self):
         # Расчет средств на вкладах
         self.portfolio['holdings'] = self.portfolio['signal'] * \
             self.bars['close']
@@ -128,177 +175,122 @@ class MarketOnClosePortfolio(Portfolio):
             self.portfolio['holdings']
         self.portfolio['change'] = self.portfolio['total'].pct_change()
 
+    def _backtest_chunks(self, summary: list, spill: str, chunk_size: int):
+        for field in summary:
+            assert field in SUMMARY_FIELDS, field
+
+        close = self.bars['close'].to_numpy(dtype='float64')
+        signal = self.portfolio['signal'].to_numpy(dtype='float64')
+        positions = self.portfolio['positions'].to_numpy(dtype='float64')
+
+        target = None
+        if spill is not None:
+            # Подменить можно только набор частей: чужие файлы не удаляются
+            if path.exists(spill):
+                assert len(columnar.list_parts(spill)) == len(listdir(spill)), \
+                    'Каталог {} не является набором частей'.format(spill)
+
+            # Кривая пишется рядом и подменяет старую после прогона
+            target = spill + '.tmp'
+            if path.exists(target):
+                rmtree(target)
+
+        # Состояние, переносимое между кусками
+        flow = 0.0
+        last_total = np.nan
+        peak = -np.inf
+        result = {'total': np.nan, 'fees': 0.0, 'trades': 0, 'max_drawdown': 0.0,
+                  'bars': len(close)}
+
+        for start in range(0, len(close), chunk_size):
+            end = min(start + chunk_size, len(close))
+            price = close[start:end]
+            position = positions[start:end]
+
+            holdings = signal[start:end] * price
+            comission_maker = self.maker * np.where(position > 0, self.volume, 0.0) * price
+            comission_taker = self.taker * np.where(position < 0, self.volume, 0.0) * price
+
+            # Как (positions * close).cumsum() в pandas: NaN пропускается
+            step = position * price
+            cumulative = flow + np.nancumsum(step)
+            flow = cumulative[-1]
+            cumulative[np.isnan(step)] = np.nan
+
+            total = self.capital - comission_maker - comission_taker - cumulative + holdings
+
+            if 'fees' in summary:
+                result['fees'] += float((comission_maker + comission_taker).sum())
+            if 'trades' in summary:
+                result['trades'] += int(np.count_nonzero(position[~np.isnan(position)]))
+            if 'max_drawdown' in summary:
+                peaks = np.fmax.accumulate(np.concatenate(([peak], total)))[1:]
+                drawdown = np.nanmax(1.0 - total / peaks, initial=0.0)
+                result['max_drawdown'] = max(result['max_drawdown'], float(drawdown))
+                peak = peaks[-1]
+
+            if target is not None:
+                change = total / np.concatenate(([last_total], total[:-1])) - 1.0
+                columnar.append_frame(target, pd.DataFrame({
+                    'signal': signal[start:end],
+                    'positions': position,
+                    'holdings': holdings,
+                    'comission_maker': comission_maker,
+                    'comission_taker': comission_taker,
+                    'cash': total - holdings,
+                    'total': total,
+                    'change': change,
+                }, index=self.bars.index[start:end]))
+
+            last_total = total[-1]
+
+        if target is not None:
+            if not len(close):
+                columnar.append_frame(target, pd.DataFrame(
+                    {name: np.empty(0) for name in SPILL_COLUMNS}, index=self.bars.index[:0]))
+            if path.exists(spill):
+                rmtree(spill)
+            replace(target, spill)
+
+        result['total'] = float(last_total) if len(close) else self.capital
+        result['pnl'] = result['total'] - self.capital
+
+        self.summary = {field: result[field] for field in summary}
+
+    def get_summary(self):
+        """
+        Возвращает словарь итогов, запрошенных в backtest(summary=...).
+        """
+        return self.summary
+
     def get_portfolio(self):
         return self.portfolio
 
-    def analyze(self):
-
-        # Построение графика курсов акцивов
-        trace = go.Candlestick(
-            x=self.bars.index,
-            open=self.bars.open,
-            high=self.bars.high,
-            low=self.bars.low,
-            close=self.bars.close,
-            increasing=dict(line=dict(width=1, color='#17BECF')),
-            decreasing=dict(line=dict(width=1, color='#7F7F7F')),
-            name='Курсы {}'.format(self.symbol),
-            yaxis='y2'
-        )
-
-        # График короткой скользящей средней
-        short_window = go.Scatter(
-            x=self.signals.short_mavg.index,
-            y=self.signals.short_mavg,
-            line=dict(
-                width=1,
-                color='rgba(60, 190, 60, 1.0)'
-            ),
-            name='40-дневная SMA',
-            yaxis='y2'
-        )
-
-        # График длинной скользящей средней
-        long_window = go.Scatter(
-            x=self.signals.long_mavg.index,
-            y=self.signals.long_mavg,
-            line=dict(
-                width=1,
-                color='rgba(180, 60, 170, 1.0)'
-            ),
-            name='100-дневная SMA',
-            yaxis='y2'
-        )
-
-        # График покупок акцивов
-        buy = go.Scatter(
-            x=self.signals.short_mavg[self.signals.positions == 1.0].index,
-            y=self.signals.short_mavg[self.signals.positions == 1.0],
-            mode='markers',
-            marker=dict(
-                symbol="triangle-up",
-                size=8,
-                #         color='rgba(250, 128, 114, .9)',
-                color='red',
-                line=dict(width=1, color='rgba(0, 0, 0, 1.0)')
-            ),
-            name='Покупка акцивов',
-            yaxis='y2'
-        )
-
-        # ПГрафик продажи акцивов
-        sell = go.Scatter(
-            x=self.signals.short_mavg[self.signals.positions == -1.0].index,
-            y=self.signals.short_mavg[self.signals.positions == -1.0],
-            mode='markers',
-            marker=dict(
-                symbol="triangle-down",
-                size=8,
-                color='blue',
-                line=dict(width=1, color='black')
-            ),
-            name='Продажа акцивов',
-            yaxis='y2'
-        )
-
-        # График общего капитала при торгах
-        capital_total = go.Scatter(
-            x=self.portfolio.total.index,
-            y=self.portfolio.total,
-            line=dict(
-                width=1,
-                color='blue'
-            ),
-            name='Значение Portfolio в $',
-            yaxis='y1'
-        )
-
-        # График позиций - покупок на фоне общего капитала
-        capital_buy = go.Scatter(
-            x=self.portfolio.total[self.signals.positions == 1.0].index,
-            y=self.portfolio.total[self.signals.positions == 1.0],
-            mode='markers',
-            marker=dict(
-                symbol="triangle-up",
-                size=8,
-                color='red',
-                line=dict(width=1, color='rgba(0, 0, 0, 1.0)')
-            ),
-            name='Покупка акцивов',
-            yaxis='y1'
-        )
-
-        # График позиций - продаж на фоне общего капитала
-        capital_sell = go.Scatter(
-            x=self.portfolio.total[self.signals.positions == -1.0].index,
-            y=self.portfolio.total[self.signals.positions == -1.0],
-            mode='markers',
-            marker=dict(
-                symbol="triangle-down",
-                size=8,
-                color='black',
-                line=dict(width=1, color='blue')
-            ),
-            name='Продажа акцивов',
-            yaxis='y1'
-        )
-
-
-        # Создадим список наших постоенных графиков
-        data = [trace, short_window, long_window, buy,
-                sell, capital_total, capital_buy, capital_sell]
-
-
-        # Настройки общего графика
-        layout = go.Layout(
-            paper_bgcolor='rgb(234, 233, 241)',
-            plot_bgcolor='rgb(201, 187, 172)',
-            title='График бэк-теста стратегии Moving Average Crossover на данных биржи BitMex',
-            titlefont=dict(
-                family='Arial, sans-serif',
-                size=26,
-                color='black'
-            ),
-            xaxis=dict(
-                title='Дата',
-                titlefont=dict(
-                    family='Arial, sans-serif',
-                    size=18,
-                    color='black'
-                ),
-                rangeslider=dict(
-                    visible=True
-                ),
-                range=['2018-06-01 00:00:00', '2018-06-05 00:00:00'],
-                type='date'
-            ),
-            yaxis=dict(
-                title='Капитал $',
-                titlefont=dict(
-                    family='Arial, sans-serif',
-                    size=18,
-                    color='black'
-                ),
-                domain=[0, 0.47]
-            ),
-            yaxis2=dict(
-                title='Kурсы {} $'.format(self.symbol),
-                titlefont=dict(
-                    family='Arial, sans-serif',
-                    size=18,
-                    color='black'
-                ),
-                domain=[0.53, 1]
-            )
-        )
-
-        # В итоге сторим наш общийграфик (создаем html файл)
-        figure = go.Figure(data=data, layout=layout)
-        plot(figure, filename='pandas_analyze')
+    def analyze(self, points: int = DEFAULT_POINTS, sidecar: bool = False,
+                background: bool = False, pages: str = None):
+        """
+        Метод построения графика бэк-теста (html файл pandas_analyze.html или,
+        при разбиении на страницы, каталог pandas_analyze с index.html).
+        Возвращает путь к файлу или, при background, subprocess.Popen.
+        points     - Бюджет точек на график: свечи объединяются в корзины, линии
+                     прореживаются LTTB, сделки остаются точными (None - все бары)
+        sidecar    - Данные графиков в отдельном файле pandas_analyze.data.js
+        background - Строить отчёт в отдельном процессе, не дожидаясь его
+        pages      - Страница на каждую неделю ('week') или месяц ('month');
+                     страницы строятся в пуле процессов
+        """
+        data = report.from_portfolio(self)
+        if background:
+            return report.render_in_background(data, 'pandas_analyze', points=points,
+                                               sidecar=sidecar, auto_open=True, pages=pages)
+
+        return report.write_report(data, 'pandas_analyze', points=points,
+                                   sidecar=sidecar, auto_open=True, pages=pages)
 
 
 if __name__ == "__main__":
     import datareaderbitmex as drbitmex
+    import resultexport
 
     # Путь нашего кэша-данных
     path_cache = './cachebitmex'
@@ -341,5 +333,5 @@ if __name__ == "__main__":
     # Визуализируем
     context.analyze()
 
-    # Сохраним результаты в csv формате
-    context.get_portfolio().to_csv('portfolio_pandas.csv')
+    # Сохраним портфель и сигналы в колоночном формате (resultexport.read_export)
+    resultexport.export_portfolio('pandas_portfolio', context)
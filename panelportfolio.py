@@ -0,0 +1,149 @@
+"""
+Векторный бэк-тест портфеля из нескольких активов.
+
+Цены и сигналы - матрицы (число баров, число активов), например close из
+DataReaderBitmex.get_panel(). Позиции, комиссии maker/taker по каждому
+активу, кошелёк и общий капитал считаются за один проход по матрицам, по
+тем же правилам, что MarketOnClosePortfolio для одного актива.
+
+    python3 panelportfolio.py
+"""
+import numpy as np
+import pandas as pd
+
+from indicators import sma
+from metabacktest import Portfolio
+
+
+def crossover_signals(close: pd.DataFrame, short_window: int = 40, long_window: int = 100):
+    """
+    Метод расчёта сигналов Moving Average Crossover сразу для всех активов,
+    как в MovingAverageCrossStrategy: 1, когда короткая средняя выше длинной,
+    и 0 первые short_window баров. Средние - indicators.sma() по каждому
+    активу, поэтому сигналы совпадают с расчётом по одному активу.
+    close        - Цены закрытия (тип: pd.DataFrame(), колонки - активы)
+    short_window - Окно короткой средней скользящей
+    long_window  - Окно длинной средней скоьзящей
+    """
+    values = close.to_numpy(dtype='float64')
+
+    signals = np.zeros(values.shape)
+    for k in range(values.shape[1]):
+        # Шаг цены у каждого актива свой: средние считаются по столбцу
+        short_mavg, long_mavg = sma(values[:, k], [short_window, long_window]).T
+        signals[:, k] = short_mavg > long_mavg
+    signals[:short_window] = 0.0
+
+    return pd.DataFrame(signals, index=close.index, columns=close.columns)
+
+
+class PanelPortfolio(Portfolio):
+    """
+    Портфель нескольких активов, который покупает volume единиц каждого
+    актива по сигналу по цене закрытия бара.
+
+    Сигнал - множитель объёма (1 - держать volume единиц, 0 - не держать).
+    Цены не должны содержать пропусков: для панели используйте
+    get_panel(..., fill='ffill').
+
+    Требования:
+        close   - Цены закрытия (тип: pd.DataFrame(), колонки - активы)
+        signals - Сигналы той же формы, что и close
+        volume  - Объём покупаемых активов: число или вектор по активам.
+        capital - Объём средств на старте торговли.
+        maker - Комиссия при покупке: число или вектор по активам.
+        taker - Комиссия при продаже: число или вектор по активам.
+    """
+
+    def __init__(self, close: pd.DataFrame, signals: pd.DataFrame, volume=10,
+                 capital: float = 1000000.0, maker=0.00025, taker=0.00075):
+        assert close.shape == signals.shape, (close.shape, signals.shape)
+
+        self.close = close
+        self.signals = signals
+        self.capital = float(capital)
+
+        n = close.shape[1]
+        # Числа приводятся к вектору по активам
+        self.volume = np.broadcast_to(np.asarray(volume, dtype='float64'), (n,))
+        self.maker = np.broadcast_to(np.asarray(maker, dtype='float64'), (n,))
+        self.taker = np.broadcast_to(np.asarray(taker, dtype='float64'), (n,))
+
+        self.portfolio = None
+        self.holdings = None
+        self.positions = None
+
+    def backtest(self):
+        close = self.close.to_numpy(dtype='float64')
+        assert not np.isnan(close).any(), 'Пропуски в ценах: используйте fill=\'ffill\''
+
+        units = self.signals.to_numpy(dtype='float64') * self.volume
+        positions = np.diff(units, axis=0, prepend=0.0)
+
+        holdings = units * close
+        trade = np.abs(positions) * close
+        comission_maker = (self.maker * np.where(positions > 0, trade, 0.0)).sum(axis=1)
+        comission_taker = (self.taker * np.where(positions < 0, trade, 0.0)).sum(axis=1)
+
+        # Формула кошелька та же, что в MarketOnClosePortfolio.backtest()
+        cash = self.capital - comission_maker - comission_taker - \
+            np.cumsum((positions * close).sum(axis=1))
+        total = cash + holdings.sum(axis=1)
+
+        index = self.close.index
+        self.holdings = pd.DataFrame(holdings, index=index, columns=self.close.columns)
+        self.positions = pd.DataFrame(positions, index=index, columns=self.close.columns)
+
+        self.portfolio = pd.DataFrame({
+            'holdings': holdings.sum(axis=1),
+            'comission_maker': comission_maker,
+            'comission_taker': comission_taker,
+            'cash': cash,
+            'total': total,
+        }, index=index)
+        self.portfolio['change'] = self.portfolio['total'].pct_change()
+
+    def get_portfolio(self):
+        return self.portfolio
+
+    def get_holdings(self):
+        """
+        Возвращает DataFrame стоимости позиций по каждому активу.
+        """
+        return self.holdings
+
+    def get_positions(self):
+        """
+        Возвращает DataFrame сделок (изменений позиций в единицах) по каждому активу.
+        """
+        return self.positions
+
+
+if __name__ == "__main__":
+    import datareaderbitmex as drbitmex
+
+    # Путь нашего кэша-данных
+    path_cache = './cachebitmex'
+
+    # Корзина контрактов и объёмы по каждому
+    symbols = ['XBTUSD', 'ETHUSD']
+    volume = [10, 100]
+
+    # Период запрошаемых данных
+    start_session = pd.to_datetime('2018-6-1', utc=True)
+    end_session = pd.to_datetime('2018-9-1', utc=True)
+
+    # Частота
+    data_frequency = '5m'
+
+    dR = drbitmex.DataReaderBitmex(path_cash=path_cache,
+                                   symbol=symbols[0], data_frequency=data_frequency)
+    panel = dR.get_panel(symbols, start_session, end_session, fill='ffill')
+
+    # Бары до первой цены любого из активов отбрасываем
+    close = panel['close'].dropna()
+
+    context = PanelPortfolio(close, crossover_signals(close), volume=volume, capital=100000.0)
+    context.backtest()
+
+    print(context.get_portfolio().tail())
@@ -0,0 +1,221 @@
+"""
+Параллельный запуск бэк-тестов MovingAverageCrossStrategy + MarketOnClosePortfolio
+на всех ядрах процессора.
+
+Бары один раз кладутся в общую память (multiprocessing.shared_memory), и каждый
+процесс подключается к ним без копирования - по задачам передаются только
+параметры прогона, а обратно возвращаются короткие записи с итогами.
+
+    python3 parallelbacktest.py
+"""
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, cpu_count
+
+from pandas_ma_crossover import MovingAverageCrossStrategy, MarketOnClosePortfolio
+
+# Параметры прогона и их значения по умолчанию
+RUN_DEFAULTS = {
+    'short_window': 40,
+    'long_window': 100,
+    'volume': 10,
+    'capital': 1000000.0,
+    'maker': 0.00025,
+    'taker': 0.00075,
+    'start_time': None,
+    'end_time': None,
+}
+
+
+class SharedBars:
+    """
+    Бары в общей памяти процессов.
+
+    Блок памяти содержит индекс времени (int64, наносекунды) и следом
+    числовые колонки одной матрицей float64 (число баров, число колонок),
+    поэтому DataFrame в процессе строится поверх неё без копирования.
+    Создатель блока освобождает его методом close() (или через with).
+
+    Требования:
+        bars - Данные курса акцива с индексом по времени (тип: pd.DataFrame())
+    """
+
+    def __init__(self, bars: pd.DataFrame):
+        columns = [column for column in bars.columns
+                   if pd.api.types.is_numeric_dtype(bars[column])]
+        index = pd.DatetimeIndex(bars.index)
+
+        self.spec = {
+            'name': None,
+            'rows': len(bars),
+            'columns': columns,
+            'index_name': bars.index.name,
+            'tz': str(index.tz) if index.tz is not None else None,
+        }
+
+        size = 8 * len(bars) * (1 + len(columns))
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.spec['name'] = self.shm.name
+
+        times, values = self._views(self.shm, self.spec)
+        if index.tz is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+        times[:] = index.values.astype('datetime64[ns]').view('int64')
+        values[:] = bars[columns].to_numpy(dtype='float64')
+
+    @staticmethod
+    def _views(shm, spec: dict):
+        rows = spec['rows']
+        times = np.ndarray((rows,), dtype='int64', buffer=shm.buf)
+        values = np.ndarray((rows, len(spec['columns'])), dtype='float64',
+                            buffer=shm.buf, offset=8 * rows)
+        return times, values
+
+    @staticmethod
+    def attach(spec: dict):
+        """
+        Метод подключения к барам в общей памяти из другого процесса.
+        Возвращает пару (блок памяти, DataFrame поверх него). Блок нужно
+        держать открытым, пока используется DataFrame.
+        spec - Описание блока (SharedBars.spec)
+        """
+        shm = shared_memory.SharedMemory(name=spec['name'])
+        times, values = SharedBars._views(shm, spec)
+
+        index = pd.DatetimeIndex(times.view('datetime64[ns]'), name=spec['index_name'])
+        if spec['tz'] is not None:
+            index = index.tz_localize('UTC').tz_convert(spec['tz'])
+
+        return shm, pd.DataFrame(values, index=index, columns=spec['columns'], copy=False)
+
+    def close(self):
+        """
+        Метод освобождения общей памяти.
+        """
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# Бары, к которым подключён процесс-исполнитель (см. _attach)
+_shm = None
+_bars = None
+_symbol = None
+
+
+def _attach(spec: dict, symbol: str):
+    global _shm, _bars, _symbol
+    _shm, _bars = SharedBars.attach(spec)
+    _symbol = symbol
+
+
+def run_backtest(bars: pd.DataFrame, symbol: str, params: dict):
+    """
+    Метод одного бэк-теста. Возвращает запись: параметры прогона и
+        total  - Итоговый капитал
+        fees   - Сумма комиссий maker и taker
+        trades - Число сделок
+        bars   - Число баров в прогоне
+    bars   - Данные курса акцива (тип: pd.DataFrame())
+    symbol - Символ акцива
+    params - Параметры прогона (ключи RUN_DEFAULTS, недостающие берутся оттуда)
+    """
+    run = dict(RUN_DEFAULTS, **params)
+
+    # Диапазон дат - срез по бинарному поиску, без копирования
+    i = 0 if run['start_time'] is None else bars.index.searchsorted(run['start_time'])
+    j = len(bars) if run['end_time'] is None else bars.index.searchsorted(run['end_time'])
+    bars = bars.iloc[i:j]
+
+    strategy = MovingAverageCrossStrategy(symbol=symbol,
+                                          bars=bars,
+                                          short_window=run['short_window'],
+                                          long_window=run['long_window'])
+    context = MarketOnClosePortfolio(strategy=strategy,
+                                     volume=run['volume'],
+                                     capital=run['capital'],
+                                     maker=run['maker'],
+                                     taker=run['taker'])
+    context.backtest()
+    portfolio = context.get_portfolio()
+
+    return dict(
+        params,
+        total=float(portfolio['total'].iloc[-1]) if len(portfolio) else run['capital'],
+        fees=float((portfolio['comission_maker'] + portfolio['comission_taker']).sum()),
+        trades=int(np.count_nonzero(portfolio['positions'].fillna(0).values)),
+        bars=len(portfolio),
+    )
+
+
+def _run(params: dict):
+    return run_backtest(_bars, _symbol, params)
+
+
+def run_backtests(bars: pd.DataFrame,
+                  params: list,
+                  symbol: str = 'XBTUSD',
+                  processes: int = None,
+                  chunksize: int = 1):
+    """
+    Метод параллельного запуска бэк-тестов в пуле процессов.
+    Бары передаются процессам через общую память один раз.
+    Возвращает DataFrame записей run_backtest() в порядке params.
+    bars      - Данные курса акцива (тип: pd.DataFrame())
+    params    - Список параметров прогонов (словари с ключами RUN_DEFAULTS)
+    symbol    - Символ акцива
+    processes - Число процессов (по умолчанию по числу ядер)
+    chunksize - Число прогонов, отправляемых процессу за раз
+    """
+    if processes is None:
+        processes = cpu_count()
+
+    with SharedBars(bars) as shared:
+        with ProcessPoolExecutor(max_workers=processes,
+                                 initializer=_attach,
+                                 initargs=(shared.spec, symbol)) as executor:
+            records = list(executor.map(_run, params, chunksize=chunksize))
+
+    return pd.DataFrame(records)
+
+
+if __name__ == "__main__":
+    import itertools
+    import datareaderbitmex as drbitmex
+
+    # Путь нашего кэша-данных
+    path_cache = './cachebitmex'
+
+    # Контракт
+    symbol = 'XBTUSD'
+
+    # Период запрошаемых данных
+    start_session = pd.to_datetime('2018-6-1', utc=True)
+    end_session = pd.to_datetime('2018-9-1', utc=True)
+
+    # Частота
+    data_frequency = '5m'
+
+    # Загрузим данные
+    dR = drbitmex.DataReaderBitmex(path_cash=path_cache,
+                                   symbol=symbol, data_frequency=data_frequency)
+    bars = dR.get_bars(start_session, end_session)
+
+    # Сетка окон и объёмов
+    params = [
+        {'short_window': short_window, 'long_window': long_window,
+         'volume': volume, 'capital': 100000.0}
+        for short_window, long_window, volume in itertools.product(
+            range(10, 110, 10), range(50, 550, 50), (1, 10))
+        if short_window < long_window
+    ]
+
+    results = run_backtests(bars, params, symbol=symbol, chunksize=8)
+
+    print(results.sort_values('total', ascending=False).head(10).to_string())
@@ -0,0 +1,403 @@
+"""
+Общий отчёт бэк-теста стратегии Moving Average Crossover.
+
+Отчёт не зависит от движка: результаты Pandas (MarketOnClosePortfolio) и
+Catalyst (results из run_algorithm) приводятся к одному контейнеру
+ReportData - ось времени, свечи, скользящие средние, капитал и список
+сделок, - по которому графики строятся один раз (build_report) и пишутся
+в HTML через chartreport.ChartReport.
+
+Длинный бэк-тест можно разбить на страницы по неделям или месяцам
+(write_pages): каждая страница содержит только свой отрезок данных, страницы
+строятся в пуле процессов, а index.html ссылается на них.
+
+Построение отчёта может идти в отдельном процессе (render_in_background):
+бэк-тест продолжает работу или завершается, не дожидаясь записи HTML.
+
+    python3 report.py <файл задания>  - запуск фонового построения
+"""
+import argparse
+import html
+import pickle
+import subprocess
+import sys
+import tempfile
+import webbrowser
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import cpu_count
+from os import path, remove, fdopen, makedirs
+
+from chartreport import ChartReport, write_plotlyjs
+from downsample import DEFAULT_POINTS, ohlc_buckets, downsample_line
+
+# Цвета скользящих средних по порядку
+MAVG_COLORS = ('rgba(60, 190, 60, 1.0)', 'rgba(180, 60, 170, 1.0)')
+
+# Разбиение на страницы: период pandas и формат имени страницы
+PAGES = {
+    'week': ('W', '%Y-%m-%d'),
+    'month': ('M', '%Y-%m'),
+}
+
+# Заголовок отчёта
+TITLE = 'График бэк-теста стратегии Moving Average Crossover на данных биржи BitMex'
+
+
+class ReportData:
+    """
+    Результаты бэк-теста в виде, не зависящем от движка.
+
+    Требования:
+        symbol - Симбол валютной пары
+        bars   - Свечи с колонками open, high, low, close; их индекс - ось времени
+        mavgs  - Скользящие средние: словарь название -> pd.Series(); маркеры
+                 сделок на графике курсов ставятся на первую из них
+        equity - Капитал (тип: pd.Series())
+        trades - Сделки (тип: pd.DataFrame(), индекс - время бара сделки,
+                 колонка side: 1 - покупка, -1 - продажа)
+    """
+
+    def __init__(self, symbol: str, bars: pd.DataFrame, mavgs: dict,
+                 equity: pd.Series, trades: pd.DataFrame):
+        self.symbol = symbol
+        self.bars = bars[['open', 'high', 'low', 'close']]
+        self.mavgs = OrderedDict(mavgs)
+        self.equity = equity
+        self.trades = trades
+
+    def get_buys(self):
+        """
+        Возвращает время баров покупок.
+        """
+        return self.trades.index[self.trades['side'] > 0]
+
+    def get_sells(self):
+        """
+        Возвращает время баров продаж.
+        """
+        return self.trades.index[self.trades['side'] < 0]
+
+    def slice(self, start, end):
+        """
+        Метод получения ReportData на отрезке времени [start, end] включительно.
+        """
+        trades = self.trades[(self.trades.index >= start) & (self.trades.index <= end)]
+
+        return ReportData(
+            symbol=self.symbol,
+            bars=self.bars.loc[start:end],
+            mavgs=((name, mavg.loc[start:end]) for name, mavg in self.mavgs.items()),
+            equity=self.equity.loc[start:end],
+            trades=trades,
+        )
+
+
+def from_portfolio(portfolio, mavg_names=('40-дневная SMA', '100-дневная SMA')):
+    """
+    Метод получения ReportData из MarketOnClosePortfolio после backtest().
+    portfolio  - Портфолио (pandas_ma_crossover.MarketOnClosePortfolio)
+    mavg_names - Названия короткой и длинной скользящих средних
+    """
+    signals = portfolio.signals
+    positions = signals['positions']
+    changed = positions.notna() & (positions != 0)
+
+    return ReportData(
+        symbol=portfolio.symbol,
+        bars=portfolio.bars,
+        mavgs=zip(mavg_names, (signals['short_mavg'], signals['long_mavg'])),
+        equity=portfolio.portfolio['total'],
+        trades=pd.DataFrame({'side': np.sign(positions[changed])}, index=signals.index[changed]),
+    )
+
+
+def from_catalyst(results: pd.DataFrame, symbol: str,
+                  mavg_names=('40-дневная SMA', '100-дневная SMA')):
+    """
+    Метод получения ReportData из результатов run_algorithm Catalyst.
+    Сделки берутся из вложенной колонки transactions без промежуточных файлов.
+    results    - Результаты Catalyst (тип: pd.DataFrame())
+    symbol     - Название актива
+    mavg_names - Названия короткой и длинной скользящих средних
+    """
+    # Вложенные списки не пусты только на барах сделок
+    times = []
+    amounts = []
+    for transactions in results['transactions']:
+        for transaction in transactions or ():
+            times.append(transaction['dt'])
+            amounts.append(transaction['amount'])
+
+    # Время сделок - в UTC, как ось результатов (и при пустом списке сделок)
+    index = pd.DatetimeIndex(pd.to_datetime(times, utc=True))
+    if getattr(results.index, 'tz', None) is None:
+        index = index.tz_localize(None)
+
+    trades = pd.DataFrame({'side': np.sign(np.asarray(amounts, dtype='float64'))},
+                          index=index)
+
+    return ReportData(
+        symbol=symbol,
+        bars=results,
+        mavgs=zip(mavg_names, (results['short_mavg'], results['long_mavg'])),
+        equity=results['portfolio_value'],
+        trades=trades,
+    )
+
+
+def _markers(report: ChartReport, times, values: pd.Series, up: bool, yaxis: str):
+    # Маркеры сделок по полным данным, без прореживания
+    if up:
+        marker = dict(symbol='triangle-up', size=8, color='red',
+                      line=dict(width=1, color='rgba(0, 0, 0, 1.0)'))
+    elif yaxis == 'y2':
+        marker = dict(symbol='triangle-down', size=8, color='blue',
+                      line=dict(width=1, color='black'))
+    else:
+        marker = dict(symbol='triangle-down', size=8, color='black',
+                      line=dict(width=1, color='blue'))
+
+    return dict(
+        type='scatter',
+        x=report.x(times),
+        y=report.y(values[times]),
+        mode='markers',
+        marker=marker,
+        name='Покупка акцивов' if up else 'Продажа акцивов',
+        yaxis=yaxis
+    )
+
+
+def _font(size: int):
+    # Шрифт заголовков: title=dict(text=..., font=...) - формат plotly.js 2+
+    return dict(family='Arial, sans-serif', size=size, color='black')
+
+
+def build_report(data: ReportData, points: int = DEFAULT_POINTS, title: str = TITLE):
+    """
+    Метод построения графиков отчёта. Возвращает пару (ChartReport, layout).
+    data   - Результаты бэк-теста (ReportData)
+    points - Бюджет точек на график: свечи объединяются в корзины, линии
+             прореживаются LTTB, сделки остаются точными (None - все бары)
+    title  - Заголовок графика
+    """
+    report = ChartReport(data.bars.index)
+    buys, sells = data.get_buys(), data.get_sells()
+
+    # Построение графика курсов акцивов
+    bars = ohlc_buckets(data.bars, points)
+    report.add_trace(dict(
+        type='candlestick',
+        x=report.x(bars.index),
+        open=report.y(bars.open),
+        high=report.y(bars.high),
+        low=report.y(bars.low),
+        close=report.y(bars.close),
+        increasing=dict(line=dict(width=1, color='#17BECF')),
+        decreasing=dict(line=dict(width=1, color='#7F7F7F')),
+        name='Курсы {}'.format(data.symbol),
+        yaxis='y2'
+    ))
+
+    # Графики скользящих средних
+    for (name, mavg), color in zip(data.mavgs.items(), MAVG_COLORS):
+        line = downsample_line(mavg, points)
+        report.add_trace(dict(
+            type='scatter',
+            x=report.x(line.index),
+            y=report.y(line),
+            line=dict(width=1, color=color),
+            name=name,
+            yaxis='y2'
+        ))
+
+    # Графики покупок и продаж акцивов
+    first = next(iter(data.mavgs.values()))
+    report.add_trace(_markers(report, buys, first, True, 'y2'))
+    report.add_trace(_markers(report, sells, first, False, 'y2'))
+
+    # График общего капитала при торгах
+    equity = downsample_line(data.equity, points)
+    report.add_trace(dict(
+        type='scatter',
+        x=report.x(equity.index),
+        y=report.y(equity),
+        line=dict(width=1, color='blue'),
+        name='Значение Portfolio в $',
+        yaxis='y1'
+    ))
+
+    # Графики позиций на фоне общего капитала
+    report.add_trace(_markers(report, buys, data.equity, True, 'y1'))
+    report.add_trace(_markers(report, sells, data.equity, False, 'y1'))
+
+    # Настройки общего графика
+    layout = dict(
+        paper_bgcolor='rgb(234, 233, 241)',
+        plot_bgcolor='rgb(201, 187, 172)',
+        title=dict(text=title, font=_font(26)),
+        xaxis=dict(
+            title=dict(text='Дата', font=_font(18)),
+            rangeslider=dict(visible=True),
+            type='date'
+        ),
+        yaxis=dict(
+            title=dict(text='Капитал $', font=_font(18)),
+            domain=[0, 0.47]
+        ),
+        yaxis2=dict(
+            title=dict(text='Kурсы {} $'.format(data.symbol), font=_font(18)),
+            domain=[0.53, 1]
+        )
+    )
+
+    return report, layout
+
+
+def write_report(data: ReportData, filename: str, points: int = DEFAULT_POINTS,
+                 sidecar: bool = False, auto_open: bool = False,
+                 pages: str = None, processes: int = None):
+    """
+    Метод построения и записи отчёта. Возвращает путь к HTML файлу
+    (при разбиении на страницы - к index.html).
+    data      - Результаты бэк-теста (ReportData)
+    filename  - Имя HTML файла или, при разбиении на страницы, каталога
+    points    - Бюджет точек на график (None - все бары)
+    sidecar   - Данные графиков в отдельном файле <имя>.data.js
+    auto_open - Открыть отчёт в браузере
+    pages     - Разбиение на страницы: 'week', 'month' (None - одна страница)
+    processes - Число процессов построения страниц (по умолчанию по числу ядер)
+    """
+    if pages is not None:
+        return write_pages(data, filename, pages, points=points, sidecar=sidecar,
+                           auto_open=auto_open, processes=processes)
+
+    report, layout = build_report(data, points)
+    return report.write(filename, layout, sidecar=sidecar, auto_open=auto_open)
+
+
+def _write_page(job):
+    # Построение одной страницы в процессе пула
+    data, filename, title, points, sidecar = job
+    report, layout = build_report(data, points, title=title)
+    return report.write(filename, layout, sidecar=sidecar)
+
+
+def _value(series: pd.Series, last: bool):
+    values = series.dropna()
+    if values.empty:
+        return np.nan
+    return values.iloc[-1] if last else values.iloc[0]
+
+
+def _write_index(folder: str, data: ReportData, rows: list):
+    # Страница со ссылками на страницы периодов и их итогами
+    cells = []
+    for row in rows:
+        cells.append('<tr><td><a href="{}">{}</a></td><td>{}</td><td>{}</td>'
+                     '<td>{:.2f}</td><td>{:.2f}</td><td>{:+.2f}</td></tr>'.format(
+                         html.escape(row['file']), html.escape(row['label']), row['bars'],
+                         row['trades'], row['start'], row['end'], row['end'] - row['start']))
+
+    pt = path.join(folder, 'index.html')
+    with open(pt, 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>{0}</title>\n'
+                '<style>body {{font-family: Arial, sans-serif; background: rgb(234, 233, 241)}} '
+                'td, th {{padding: 2px 12px; text-align: right}}</style></head>\n'
+                '<body>\n<h2>{0}</h2>\n<p>Курсы {1}</p>\n<table>\n'
+                '<tr><th>Период</th><th>Баров</th><th>Сделок</th><th>Капитал на начало $</th>'
+                '<th>Капитал на конец $</th><th>Доход $</th></tr>\n{2}\n</table>\n</body>\n</html>\n'
+                .format(html.escape(TITLE), html.escape(data.symbol), '\n'.join(cells)))
+
+    return pt
+
+
+def write_pages(data: ReportData, folder: str, pages: str = 'month', points: int = DEFAULT_POINTS,
+                sidecar: bool = False, auto_open: bool = False, processes: int = None):
+    """
+    Метод записи отчёта по страницам: на каждую неделю или месяц своя страница
+    только с его барами, средними, капиталом и сделками, плюс index.html со
+    ссылками и итогами периодов. Страницы строятся в пуле процессов.
+    Возвращает путь к index.html.
+    data      - Результаты бэк-теста (ReportData)
+    folder    - Каталог отчёта
+    pages     - Период страницы: 'week' или 'month'
+    points    - Бюджет точек на график страницы (None - все бары)
+    sidecar   - Данные графиков в отдельных файлах <страница>.data.js
+    auto_open - Открыть index.html в браузере
+    processes - Число процессов (по умолчанию по числу ядер)
+    """
+    assert pages in PAGES, pages
+    freq, name_format = PAGES[pages]
+
+    folder = path.abspath(folder)
+    makedirs(folder, exist_ok=True)
+    # plotly.js пишется один раз до запуска пула
+    write_plotlyjs(folder)
+
+    index = data.bars.index
+    naive = index.tz_convert(None) if index.tz is not None else index
+    periods = naive.to_period(freq)
+    ordinals = periods.asi8
+    starts = np.flatnonzero(np.r_[True, ordinals[1:] != ordinals[:-1]])
+    ends = np.r_[starts[1:], len(index)] - 1
+
+    jobs = []
+    rows = []
+    for start, end in zip(starts, ends):
+        label = periods[start].start_time.strftime(name_format)
+        page = data.slice(index[start], index[end])
+        jobs.append((page, path.join(folder, label + '.html'),
+                     '{} ({})'.format(TITLE, label), points, sidecar))
+        # Капитал на начало - капитал на конец предыдущей страницы
+        rows.append({'label': label, 'file': label + '.html', 'bars': end - start + 1,
+                     'trades': len(page.trades),
+                     'start': rows[-1]['end'] if rows else _value(page.equity, False),
+                     'end': _value(page.equity, True)})
+
+    if processes is None:
+        processes = cpu_count()
+
+    if processes > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(processes, len(jobs))) as executor:
+            list(executor.map(_write_page, jobs))
+    else:
+        for job in jobs:
+            _write_page(job)
+
+    pt = _write_index(folder, data, rows)
+    if auto_open:
+        webbrowser.open('file://' + pt)
+
+    return pt
+
+
+def render_in_background(data: ReportData, filename: str, **kwargs):
+    """
+    Метод построения отчёта в отдельном процессе (write_report). Процесс не
+    привязан к вызывающему: тот может продолжать работу или завершиться.
+    Возвращает subprocess.Popen; wait() - дождаться записи отчёта.
+    data     - Результаты бэк-теста (ReportData)
+    filename - Имя HTML файла
+    kwargs   - Параметры write_report()
+    """
+    fd, job = tempfile.mkstemp(prefix='report-', suffix='.pickle')
+    with fdopen(fd, 'wb') as f:
+        pickle.dump((data, path.abspath(filename), kwargs), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return subprocess.Popen([sys.executable, path.abspath(__file__), job], start_new_session=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Фоновое построение отчёта бэк-теста')
+    parser.add_argument('job', help='Файл задания render_in_background()')
+    args = parser.parse_args()
+
+    with open(args.job, 'rb') as f:
+        data, filename, kwargs = pickle.load(f)
+    remove(args.job)
+
+    write_report(data, filename, **kwargs)
@@ -0,0 +1,144 @@
+"""
+Выгрузка результатов бэк-теста в колоночном формате.
+
+Кадры портфеля и сигналов (MarketOnClosePortfolio) и результаты Catalyst
+пишутся не одним текстовым CSV, а набором частей columnar.py: кусками по
+chunk_size строк, каждая колонка - отдельный файл, при желании сжатый zstd
+или lz4. Вложенные колонки Catalyst (transactions, orders, positions)
+хранятся как JSON.
+
+В режиме дописывания (mode='a') пишутся только строки новее последней
+выгруженной, поэтому повторная выгрузка продлённого прогона добавляет
+лишь новые бары. Читать можно только нужные колонки и отрезок времени.
+
+    python3 resultexport.py pandas_portfolio/portfolio --columns total cash
+"""
+import argparse
+import pandas as pd
+from os import path, replace
+from shutil import rmtree
+
+import columnar
+
+# Число строк в части по умолчанию
+CHUNK_SIZE = 2**16
+
+# Режимы выгрузки: перезапись и дописывание
+MODES = ('w', 'a')
+
+
+def _last_index(pt: str):
+    # Последняя метка индекса набора (читается только индекс последней части)
+    parts = columnar.list_parts(pt)
+    if not parts:
+        return None, None
+
+    meta = columnar.read_meta(parts[-1])
+    index = columnar.read_frame(parts[-1], columns=[]).index
+    return (index[-1] if len(index) else None), [column['name'] for column in meta['columns']]
+
+
+def export_frame(pt: str, df: pd.DataFrame, mode: str = 'w', columns: list = None,
+                 chunk_size: int = CHUNK_SIZE, compression: str = None, ticks: list = None):
+    """
+    Метод выгрузки DataFrame в набор частей columnar.py.
+    Возвращает число записанных строк.
+    pt          - Путь к каталогу набора
+    df          - Данные, индекс по возрастанию (например время баров)
+    mode        - 'w' - перезаписать набор, 'a' - дописать строки новее последней
+                  выгруженной (колонки должны совпадать с уже выгруженными)
+    columns     - Выгружаемые колонки (по умолчанию все)
+    chunk_size  - Число строк в части
+    compression - Сжатие файлов колонок: None, 'zstd' или 'lz4'
+    ticks       - Колонки цен, которые хранить целыми кратными шага цены
+    """
+    assert mode in MODES, mode
+    assert chunk_size > 0, chunk_size
+
+    if columns is not None:
+        df = df[list(columns)]
+
+    target = pt
+    if mode == 'a':
+        last, existing = _last_index(pt)
+        if existing is not None:
+            assert existing == [str(column) for column in df.columns], \
+                'Колонки не совпадают с выгруженными: {}'.format(existing)
+        if last is not None:
+            df = df[df.index > last]
+    else:
+        # Новый набор пишется рядом и подменяет старый целиком
+        target = pt + '.tmp'
+        if path.exists(target):
+            rmtree(target)
+
+    for start in range(0, len(df), chunk_size):
+        columnar.append_frame(target, df.iloc[start:start + chunk_size],
+                              compression=compression, ticks=ticks)
+
+    if mode == 'w':
+        if not len(df):
+            columnar.append_frame(target, df, compression=compression, ticks=ticks)
+        if path.exists(pt):
+            rmtree(pt)
+        replace(target, pt)
+
+    return len(df)
+
+
+def read_export(pt: str, columns: list = None, start=None, end=None, float_dtype: str = None):
+    """
+    Метод чтения выгруженного набора.
+    pt          - Путь к каталогу набора
+    columns     - Загружаемые колонки (по умолчанию все)
+    start       - Начало отрезка по индексу включительно (по умолчанию с начала)
+    end         - Конец отрезка по индексу включительно (по умолчанию до конца)
+    float_dtype - Тип колонок с плавающей точкой, как в columnar.read_frame()
+    """
+    if start is None and end is None:
+        return columnar.read_parts(pt, columns=columns, float_dtype=float_dtype)
+
+    frames = []
+    for part in columnar.list_parts(pt):
+        # Части вне отрезка пропускаются по одному индексу, без колонок
+        index = columnar.read_frame(part, columns=[]).index
+        if not len(index) or (start is not None and index[-1] < start) or \
+                (end is not None and index[0] > end):
+            continue
+        frames.append(columnar.read_frame(part, columns=columns, float_dtype=float_dtype))
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.concat(frames)
+    return df.loc[start:end]
+
+
+def export_portfolio(pt: str, portfolio, mode: str = 'w', **kwargs):
+    """
+    Метод выгрузки портфеля и сигналов MarketOnClosePortfolio в наборы
+    <pt>/portfolio и <pt>/signals. Возвращает число записанных строк портфеля.
+    pt        - Путь к каталогу выгрузки
+    portfolio - Портфолио после backtest()
+    mode      - Режим выгрузки, как в export_frame()
+    kwargs    - Параметры export_frame(): chunk_size, compression, ticks
+    """
+    rows = export_frame(path.join(pt, 'portfolio'), portfolio.get_portfolio(), mode=mode, **kwargs)
+    export_frame(path.join(pt, 'signals'), portfolio.signals, mode=mode, **kwargs)
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Просмотр выгруженного набора результатов')
+    parser.add_argument('path')
+    parser.add_argument('--columns', nargs='+', default=None)
+    parser.add_argument('--start', default=None)
+    parser.add_argument('--end', default=None)
+    args = parser.parse_args()
+
+    start = pd.to_datetime(args.start, utc=True) if args.start else None
+    end = pd.to_datetime(args.end, utc=True) if args.end else None
+
+    df = read_export(args.path, columns=args.columns, start=start, end=end)
+    print(df.tail())
+    print('Строк:', len(df))
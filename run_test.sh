@@ -14,6 +14,9 @@ if [ ! -f $PATH_CACHE ]; then
     mkdir $PATH_CACHE
 fi
 
+# Проверим точную работу с ценами, кратными шагу цены
+python3 check_ticks.py || exit 1
+
 # ===== Запуска бек-теста на Pandas ======
 python3 pandas_ma_crossover.py
 
@@ -33,3 +36,6 @@ python3 catalyst_ma_crossover.py
 
 # 2 метод - через командную строку
 #catalyst run -f catalyst_ma_crossover.py -x gdax --start $START_SESSION --end $END_SESSION -c usd --capital-base $CAPITAL
+
+# Сверим быстрый бэк-тест на массивах с результатами Catalyst
+python3 check_catalyst.py --results catalyst_portfolio --capital $CAPITAL
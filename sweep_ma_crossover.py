@@ -0,0 +1,190 @@
+"""
+Векторный перебор окон стратегии Moving Average Crossover.
+
+Все скользящие средние строятся из одной префиксной суммы close, а сигналы
+и капитал для всех пар (short_window, long_window) считаются двумерными
+массивами numpy - без построения DataFrame на каждую пару. Правила сигналов,
+комиссий и расчёта капитала те же, что в MovingAverageCrossStrategy и
+MarketOnClosePortfolio (pandas_ma_crossover.py).
+
+    python3 sweep_ma_crossover.py
+"""
+import numpy as np
+import pandas as pd
+
+from indicators import sma
+
+# Поля результата перебора
+SWEEP_FIELDS = ('total', 'fees', 'trades')
+
+
+def rolling_means(close, windows):
+    """
+    Метод расчёта простых скользящих средних сразу для нескольких окон
+    (indicators.sma). Как rolling(window, min_periods=1).mean():
+    пока баров меньше окна, берётся среднее по всем имеющимся барам.
+    Возвращает массив формы (число баров, число окон).
+    close   - Цены закрытия (тип: np.ndarray или pd.Series)
+    windows - Окна скользящих средних
+    """
+    return sma(close, windows)
+
+
+def _crossover(short_mavg: np.ndarray, long_mavg: np.ndarray, window: int, first: int):
+    # Сигналы и сделки одной короткой средней против всех длинных
+    rows = first + np.arange(len(short_mavg))[:, None]
+    signal = (short_mavg[:, None] > long_mavg) & (rows >= window)
+    positions = np.diff(signal.astype('float64'), axis=0, prepend=0.0)
+    return signal, positions
+
+
+def crossover_curves(close: np.ndarray,
+                     short_mavg: np.ndarray,
+                     long_mavg: np.ndarray,
+                     short_window: int,
+                     first: int = 0,
+                     volume: int = 10,
+                     capital: float = 1000000.0,
+                     maker: float = 0.00025,
+                     taker: float = 0.00075):
+    """
+    Метод расчёта кривых капитала одной короткой средней против всех длинных.
+    Возвращает словарь массивов формы (число баров, число длинных окон) с
+    колонками MarketOnClosePortfolio: positions, comission (maker + taker),
+    total. Кривые можно сразу оценить metrics.evaluate().
+    close        - Цены закрытия (тип: np.ndarray)
+    short_mavg   - Короткая средняя, форма (число баров,)
+    long_mavg    - Длинные средние, форма (число баров, число длинных окон)
+    short_window - Окно короткой средней
+    first, volume, capital, maker, taker - как в sweep_means()
+    """
+    signal, positions = _crossover(short_mavg, long_mavg, short_window, first)
+
+    comission = volume * close[:, None] * (maker * (positions > 0) + taker * (positions < 0))
+    total = capital - comission - volume * np.cumsum(positions * close[:, None], axis=0) + \
+        volume * signal * close[:, None]
+
+    return {'positions': positions * volume, 'comission': comission, 'total': total}
+
+
+def sweep_means(close: np.ndarray,
+                short_mavg: np.ndarray,
+                long_mavg: np.ndarray,
+                short_windows: np.ndarray,
+                first: int = 0,
+                volume: int = 10,
+                capital: float = 1000000.0,
+                maker: float = 0.00025,
+                taker: float = 0.00075):
+    """
+    Метод бэк-теста всех пар окон по уже посчитанным скользящим средним,
+    например по срезу средних, посчитанных один раз на всём ряде.
+    Каждый прогон начинается без позиции. Возвращает три массива формы
+    (число коротких окон, число длинных окон): total, fees, trades (см. sweep()).
+    close         - Цены закрытия (тип: np.ndarray)
+    short_mavg    - Короткие средние, форма (число баров, число коротких окон)
+    long_mavg     - Длинные средние, форма (число баров, число длинных окон)
+    short_windows - Окна коротких средних
+    first         - Номер первого бара среза во всём ряде: сигнал не
+                    выставляется на барах с номером меньше short_window
+    volume        - Объём покупаемых активов
+    capital       - Объём средств на старте торговли
+    maker         - Комиссия при покупке
+    taker         - Комиссия при продаже
+    """
+    shape = (len(short_windows), long_mavg.shape[1])
+    total = np.empty(shape)
+    fees = np.empty(shape)
+    trades = np.empty(shape, dtype='int64')
+
+    # Цикл только по коротким окнам: все длинные окна считаются одним
+    # массивом (число баров, число длинных окон)
+    for i, window in enumerate(short_windows):
+        signal, positions = _crossover(short_mavg[:, i], long_mavg, window, first)
+
+        commission = close[:, None] * (maker * (positions > 0) + taker * (positions < 0))
+
+        fees[i] = volume * commission.sum(axis=0)
+        trades[i] = np.count_nonzero(positions, axis=0)
+
+        # cash[-1] + holdings[-1] из MarketOnClosePortfolio.backtest()
+        total[i] = capital - volume * commission[-1] - \
+            volume * (close @ positions) + \
+            volume * signal[-1] * (close[-1] if len(close) else 0.0)
+
+    return total, fees, trades
+
+
+def sweep(close,
+          short_windows,
+          long_windows,
+          volume: int = 10,
+          capital: float = 1000000.0,
+          maker: float = 0.00025,
+          taker: float = 0.00075):
+    """
+    Метод бэк-теста стратегии для всех пар окон (short_window, long_window).
+
+    Результат - DataFrame с индексом short_window и колонками (поле, long_window):
+        total  - Итоговый капитал (последнее значение total в MarketOnClosePortfolio)
+        fees   - Сумма комиссий maker и taker за весь период
+        trades - Число сделок (покупок и продаж)
+    Матрицу одного поля можно получить как result['total'].
+
+    close         - Цены закрытия (тип: np.ndarray или pd.Series)
+    short_windows - Окна короткой скользящей средней
+    long_windows  - Окна длинной скользящей средней
+    volume        - Объём покупаемых активов
+    capital       - Объём средств на старте торговли
+    maker         - Комиссия при покупке
+    taker         - Комиссия при продаже
+    """
+    close = np.asarray(close, dtype='float64')
+    short_windows = np.atleast_1d(np.asarray(short_windows, dtype='int64'))
+    long_windows = np.atleast_1d(np.asarray(long_windows, dtype='int64'))
+
+    # Каждая средняя считается один раз, а не на каждую пару окон
+    short_mavg = rolling_means(close, short_windows)
+    long_mavg = rolling_means(close, long_windows)
+
+    total, fees, trades = sweep_means(close, short_mavg, long_mavg, short_windows,
+                                      volume=volume, capital=capital, maker=maker, taker=taker)
+
+    columns = pd.MultiIndex.from_product(
+        [list(SWEEP_FIELDS), list(long_windows)], names=['field', 'long_window'])
+    index = pd.Index(short_windows, name='short_window')
+
+    return pd.DataFrame(np.hstack([total, fees, trades]), index=index, columns=columns)
+
+
+if __name__ == "__main__":
+    import datareaderbitmex as drbitmex
+
+    # Путь нашего кэша-данных
+    path_cache = './cachebitmex'
+
+    # Контракт
+    symbol = 'XBTUSD'
+
+    # Период запрошаемых данных
+    start_session = pd.to_datetime('2018-6-1', utc=True)
+    end_session = pd.to_datetime('2018-9-1', utc=True)
+
+    # Частота
+    data_frequency = '5m'
+
+    # Загрузим данные
+    dR = drbitmex.DataReaderBitmex(path_cash=path_cache,
+                                   symbol=symbol, data_frequency=data_frequency)
+    bars = dR.get_bars(start_session, end_session)
+
+    # Сетка окон 50x50
+    result = sweep(bars['close'],
+                   short_windows=np.arange(5, 255, 5),
+                   long_windows=np.arange(20, 520, 10),
+                   capital=100000.0)
+
+    total = result['total']
+    short_window, long_window = np.unravel_index(np.nanargmax(total.values), total.shape)
+    print('Лучшая пара окон:', total.index[short_window], total.columns[long_window],
+          'капитал:', total.values[short_window, long_window])
@@ -0,0 +1,151 @@
+"""
+Walk-forward оптимизация стратегии Moving Average Crossover.
+
+Период делится на скользящие пары отрезков: in-sample, на котором перебором
+выбираются лучшие окна средних, и следующий за ним out-of-sample, на котором
+эти окна торгуются. Отрезки out-of-sample идут подряд и складываются в одну
+кривую капитала. Скользящие средние всех окон считаются один раз на всём
+ряде (sweep_ma_crossover.rolling_means) и для каждого шага оптимизации
+только вырезаются.
+
+    python3 walkforward.py
+"""
+import numpy as np
+import pandas as pd
+
+from sweep_ma_crossover import rolling_means, sweep_means
+
+
+def walk_forward(close: pd.Series,
+                 short_windows,
+                 long_windows,
+                 in_sample: int,
+                 out_of_sample: int,
+                 anchored: bool = False,
+                 volume: int = 10,
+                 capital: float = 1000000.0,
+                 maker: float = 0.00025,
+                 taker: float = 0.00075):
+    """
+    Метод walk-forward оптимизации окон (short_window, long_window).
+
+    На каждом шаге выбирается пара окон (short_window < long_window) с
+    наибольшим итоговым капиталом на in-sample, и она торгуется на следующих
+    out_of_sample барах. Кривая капитала out-of-sample считается как один
+    непрерывный бэк-тест MarketOnClosePortfolio, в котором окна меняются на
+    границах шагов (позиция через границу переносится).
+
+    Возвращает пару DataFrame:
+        folds  - по строке на шаг: границы in-sample и out-of-sample, выбранные
+                 окна, итоговый капитал in-sample и доход out-of-sample;
+        equity - сигнал, позиции и капитал total на барах out-of-sample.
+
+    close         - Цены закрытия с индексом по времени (тип: pd.Series())
+    short_windows - Окна короткой скользящей средней
+    long_windows  - Окна длинной скользящей средней
+    in_sample     - Длина in-sample в барах
+    out_of_sample - Длина out-of-sample в барах (шаг сдвига)
+    anchored      - In-sample всегда начинается с первого бара (растущее окно)
+    volume        - Объём покупаемых активов
+    capital       - Объём средств на старте торговли
+    maker         - Комиссия при покупке
+    taker         - Комиссия при продаже
+    """
+    assert in_sample > 0 and out_of_sample > 0
+
+    values = close.to_numpy(dtype='float64')
+    short_windows = np.atleast_1d(np.asarray(short_windows, dtype='int64'))
+    long_windows = np.atleast_1d(np.asarray(long_windows, dtype='int64'))
+
+    # Средние считаются один раз на всём ряде
+    short_mavg = rolling_means(values, short_windows)
+    long_mavg = rolling_means(values, long_windows)
+
+    allowed = short_windows[:, None] < long_windows[None, :]
+    assert allowed.any(), 'Нет пар окон с short_window < long_window'
+
+    folds = []
+    signal = []
+    for start in range(in_sample, len(values) - out_of_sample + 1, out_of_sample):
+        first = 0 if anchored else start - in_sample
+        window = slice(first, start)
+
+        total, _, _ = sweep_means(values[window], short_mavg[window], long_mavg[window],
+                                  short_windows, first=first, volume=volume,
+                                  capital=capital, maker=maker, taker=taker)
+        total = np.where(allowed, total, -np.inf)
+        i, j = np.unravel_index(np.argmax(total), total.shape)
+
+        oos = slice(start, start + out_of_sample)
+        signal.append((short_mavg[oos, i] > long_mavg[oos, j]) &
+                      (np.arange(oos.start, oos.stop) >= short_windows[i]))
+
+        folds.append({
+            'in_sample_start': close.index[first],
+            'out_of_sample_start': close.index[start],
+            'out_of_sample_end': close.index[start + out_of_sample - 1],
+            'short_window': short_windows[i],
+            'long_window': long_windows[j],
+            'in_sample_total': total[i, j],
+        })
+
+    if not folds:
+        return pd.DataFrame(folds), pd.DataFrame(columns=['signal', 'positions', 'total'])
+
+    # Отрезки out-of-sample идут подряд - считаем их одним бэк-тестом
+    start = in_sample
+    end = start + out_of_sample * len(folds)
+    price = values[start:end]
+    signal = np.concatenate(signal).astype('float64')
+    positions = np.diff(signal, prepend=0.0)
+
+    commission = price * (maker * (positions > 0) + taker * (positions < 0))
+    total = capital - volume * commission - volume * np.cumsum(positions * price) + \
+        volume * signal * price
+
+    equity = pd.DataFrame({
+        'signal': signal * volume,
+        'positions': positions * volume,
+        'total': total,
+    }, index=close.index[start:end])
+
+    folds = pd.DataFrame(folds)
+    # Доход шага - изменение капитала за его out-of-sample
+    ends = total[out_of_sample - 1::out_of_sample]
+    folds['out_of_sample_pnl'] = np.diff(ends, prepend=capital)
+
+    return folds, equity
+
+
+if __name__ == "__main__":
+    import datareaderbitmex as drbitmex
+
+    # Путь нашего кэша-данных
+    path_cache = './cachebitmex'
+
+    # Контракт
+    symbol = 'XBTUSD'
+
+    # Период запрошаемых данных
+    start_session = pd.to_datetime('2018-6-1', utc=True)
+    end_session = pd.to_datetime('2018-9-1', utc=True)
+
+    # Частота
+    data_frequency = '5m'
+
+    # Загрузим данные
+    dR = drbitmex.DataReaderBitmex(path_cash=path_cache,
+                                   symbol=symbol, data_frequency=data_frequency)
+    bars = dR.get_bars(start_session, end_session)
+
+    # In-sample - две недели, out-of-sample - неделя (в 5-минутных барах)
+    week = 7 * 24 * 12
+    folds, equity = walk_forward(bars['close'],
+                                 short_windows=np.arange(10, 110, 10),
+                                 long_windows=np.arange(50, 550, 50),
+                                 in_sample=2 * week,
+                                 out_of_sample=week,
+                                 capital=100000.0)
+
+    print(folds.to_string())
+    print('Капитал на конец периода:', equity['total'].iloc[-1])